@@ -1,4 +1,5 @@
 from .loglevels import LogLevel as log
 from .loglevels import LibraryLogging, log_method
-from .verify import verify, WarningException, VerificationException
+from .verify import verify, verify_all, verify_batch
+from .verify import WarningException, VerificationException
 from .mongo import get_config_from_db, get_licenses_from_db
@@ -35,6 +35,25 @@ DEBUG = {"print-saved": DebugFunctionality("print saved", False),
          "mongo": DebugFunctionality("mongo", False),
          "dev": DebugFunctionality("dev", False)}
 
+
+class DebugFlags(object):
+    # The DEBUG flag values, resolved once the configuration has been parsed
+    # so that a disabled debug category costs a single attribute check.
+    print_saved = False
+    verify = False
+    phases = False
+    scopes = False
+    summary = False
+    output_redirect = False
+    mongo = False
+    dev = False
+
+    @classmethod
+    def resolve(cls):
+        for option, flag in DEBUG.items():
+            setattr(cls, option.replace("-", "_"), bool(flag.value))
+
+
 CONFIG = {
     "include-verify-local-vars":
         ConfigOption(bool, True, "Include local variables in tracebacks "
@@ -44,11 +63,34 @@ CONFIG = {
                                   "tracebacks. Warning: Printing all locals "
                                   "in a stack trace can easily lead to "
                                   "problems due to errored output"),
+    "include-pass-local-vars":
+        ConfigOption(bool, False, "Include local variables in passed "
+                                  "verification results"),
+    "local-vars-max-length":
+        ConfigOption(int, 200, "Maximum length of the saved representation "
+                               "of each local variable"),
+    "local-vars-max-total":
+        ConfigOption(int, 4000, "Maximum total length of the saved local "
+                                "variables for each traceback entry"),
+    "local-vars-include":
+        ConfigOption(str, None, "Only save local variables with names "
+                                "matching these comma separated patterns "
+                                "(e.g. data*,expected)"),
+    "local-vars-exclude":
+        ConfigOption(str, "@py_*", "Don't save local variables with names "
+                                   "matching these comma separated patterns"),
     "traceback-stops-at-test-functions":
         ConfigOption(bool, True, "Stop the traceback at the test function"),
     "raise-warnings":
         ConfigOption(bool, True, "Raise warnings (enabled) or just save the "
                                  "result (disabled)"),
+    "keep-session-results":
+        ConfigOption(bool, False, "Keep the saved verification results of "
+                                  "all modules for the whole session"),
+    "collapse-passed-results":
+        ConfigOption(bool, False, "Print consecutive passed verifications as "
+                                  "a single row (count of passes) in the "
+                                  "saved results tables"),
     "maximum-traceback-depth":
         ConfigOption(int, 20, "Print up to the maximum limit (integer) of "
                               "stack trace entries"),
@@ -73,6 +115,65 @@ CONFIG = {
                                     "redirected to plugin log level 5)"),
     "terminal-max-level":
         ConfigOption(int, None, "Maximum log level to print to the terminal"),
+    "flight-recorder-level":
+        ConfigOption(int, None, "Minimum log level held by the flight "
+                                "recorder"),
+    "flight-recorder-size":
+        ConfigOption(int, 10000, "Maximum number of messages held by the "
+                                 "flight recorder"),
+    "collapse-repeated-lines":
+        ConfigOption(bool, False, "Collapse consecutive identical log "
+                                  "messages"),
+    "log-rate-limit":
+        ConfigOption(int, None, "Maximum number of lines logged per second"),
+    "fd-capture":
+        ConfigOption(bool, False, "Capture output written directly to file "
+                                  "descriptors 1 and 2"),
+    "test-log-max-lines":
+        ConfigOption(int, None, "Maximum number of log lines per test"),
+    "test-log-max-bytes":
+        ConfigOption(int, None, "Maximum size (bytes) of the log messages per "
+                                "test"),
+    "step-durations":
+        ConfigOption(bool, True, "Save the duration of each log step and a "
+                                 "summary of the slowest steps of each test"),
+    "slowest-steps":
+        ConfigOption(int, 10, "Number of the slowest log steps of each test "
+                              "to save"),
+    "log-step-durations":
+        ConfigOption(bool, False, "Save the duration of every log step with "
+                                  "its log message (one database update per "
+                                  "message)"),
+    "verify-call-sites":
+        ConfigOption(int, 10, "Number of verify call sites (most executed "
+                              "and most time spent verifying) to print and "
+                              "save at the end of the session, 0 to "
+                              "disable"),
+    "slowest-durations":
+        ConfigOption(int, 10, "Number of the slowest tests and fixtures to "
+                              "print and save at the end of the session, 0 "
+                              "to disable"),
+    "fixture-profile":
+        ConfigOption(int, 10, "Number of the most costly fixtures (total "
+                              "setup and teardown time) to print and save "
+                              "in the fixture profile at the end of the "
+                              "session, 0 to disable"),
+    "expensive-fixture-ms":
+        ConfigOption(int, 100, "Function scoped fixtures set up more than "
+                               "once with a mean setup and teardown time "
+                               "(ms) of at least this are reported as "
+                               "candidates for a wider scope"),
+    "profile-tests":
+        ConfigOption(str, None, "Profile (cProfile) the call phase of the "
+                                "tests with node IDs matching these comma "
+                                "separated patterns (e.g. "
+                                "*test_throughput*)"),
+    "profile-fixtures":
+        ConfigOption(bool, False, "Include the fixture setups in the profile "
+                                  "of the profiled tests"),
+    "profile-top":
+        ConfigOption(int, 20, "Number of functions (most cumulative time) of "
+                              "each test profile to log"),
     # Aviat specific options below
     "sw-major":
         ConfigOption(str, None, "Software under test major version"),
@@ -145,8 +246,14 @@ WEB_SERVER_CONFIG = {
 
 
 def debug_print(msg, flag, prettify=None):
-    # Print a debug message if the corresponding flag is set.
+    # Print a debug message if the corresponding flag is set. msg and
+    # prettify may be callables so that expensive messages are only built
+    # when the flag is set.
     if flag.value:
+        if callable(msg):
+            msg = msg()
+        if callable(prettify):
+            prettify = prettify()
         print("DEBUG({}): {}".format(flag.name, msg))
         if prettify:
             print(pformat(prettify, indent=4, width=80))
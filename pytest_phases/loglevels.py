@@ -7,13 +7,34 @@
 # are assigned a log level and associated step.
 from __future__ import print_function
 from __future__ import absolute_import
-from builtins import object, range
+import heapq
+import subprocess
+import sys
+import threading
+import time
+from builtins import object, range, str
+from collections import OrderedDict
+try:
+    # Python 3 - module name changed for PEP8 compliance
+    from queue import Queue
+except ImportError:
+    # Python 2
+    from Queue import Queue
 from .common import CONFIG
 
 MIN_LEVEL = 0
 MAX_LEVEL = 9
 INFO_LEVEL = 6
 DEBUG_LEVEL = 8
+# Maximum number of lines read from a streamed subprocess that are waiting
+# to be logged. The pipe reader threads block once this is reached (and in
+# turn the subprocess blocks once the pipe buffer is full).
+STREAM_QUEUE_SIZE = 1000
+
+# Held while a message is assigned its log level, step and index and is
+# written. Output captured at the file descriptor level is logged from a
+# reader thread.
+log_lock = threading.RLock()
 
 TAG_TO_LEVEL = {
     "HIGH": MIN_LEVEL,
@@ -21,6 +42,29 @@ TAG_TO_LEVEL = {
     "INFO": INFO_LEVEL,
     "DEBUG": DEBUG_LEVEL
 }
+# Tag automatically added to messages at these log levels
+LEVEL_TAGS = {
+    INFO_LEVEL: "INFO",
+    INFO_LEVEL+1: "INFO",
+    DEBUG_LEVEL: "DEBUG",
+    DEBUG_LEVEL+1: "DEBUG"
+}
+_NO_PARENTS = (None,) * (MAX_LEVEL - MIN_LEVEL + 1)
+try:
+    monotonic_ns = time.monotonic_ns
+except AttributeError:
+    # Python < 3.7 (Python 2 has no monotonic clock)
+    _monotonic = getattr(time, "monotonic", time.time)
+
+    def monotonic_ns():
+        return int(_monotonic() * 1e9)
+# Log messages are timestamped using the monotonic clock (nanoseconds). The
+# wall clock time at a reference monotonic time is used to convert these
+# timestamps to unix time so all timestamps are from the same clock.
+_CLOCK_REFERENCE = (time.time(), monotonic_ns())
+# Shared (interned) tag tuples keyed by the tags specified and level tag
+_interned_tags = {}
+MAX_INTERNED_TAGS = 4096
 
 
 class LogCommon(object):
@@ -53,14 +97,15 @@ class LogCommon(object):
         log level if not. The log level is then incremented and the
         content block printed at this level. The original log level is
         restored after the content is printed.
+        When the output is redirected the steps and indices for the
+        whole block are assigned in one pass and the block is written
+        as a single batch (one console write and one database insert).
         """
-        set_log_parameters(title, log_level, tags=tags)
-        current_level = get_current_level()
-        if isinstance(content, str):
-            content = content.split('\n')
-        for msgLine in content:
-            set_log_parameters(msgLine, current_level + 1, tags=tags)
-        set_level(current_level)
+        with log_lock:
+            set_log_parameters(title, log_level, tags=tags)
+            current_level = get_current_level()
+            print_lines(content, current_level + 1, tags=tags)
+            set_level(current_level)
 
 
 class LogLevel(LogCommon):
@@ -96,6 +141,117 @@ class LogLevel(LogCommon):
         current_level = get_current_level()
         set_log_parameters(msg, current_level + increment)
 
+    @staticmethod
+    def run_stream(cmd, log_level=None, tags=None, **popen_kwargs):
+        """Run a command in a subprocess and log its output line by line
+        as it is produced.
+        The command is printed at the log level passed in or the current
+        log level if not. The output is printed at the next log level,
+        lines from stdout are tagged STDOUT and lines from stderr are
+        tagged STDERR. The original log level is restored after the
+        command completes.
+        Additional keyword arguments are passed to subprocess.Popen. The
+        pipes are always read in binary mode, the output is decoded with
+        the encoding and errors arguments (if passed, default utf8 and
+        replace) and the text and universal_newlines arguments are ignored.
+        Returns the exit code of the command.
+        """
+        popen_kwargs.setdefault("shell", isinstance(cmd, str))
+        popen_kwargs.pop("text", None)
+        popen_kwargs.pop("universal_newlines", None)
+        encoding = popen_kwargs.pop("encoding", None) or "utf8"
+        errors = popen_kwargs.pop("errors", None) or "replace"
+        set_log_parameters("Running: {}".format(cmd), log_level, tags=tags)
+        current_level = get_current_level()
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, **popen_kwargs)
+        lines = Queue(maxsize=STREAM_QUEUE_SIZE)
+        readers = [
+            threading.Thread(target=_read_pipe,
+                             args=(process.stdout, "STDOUT", lines, encoding,
+                                   errors)),
+            threading.Thread(target=_read_pipe,
+                             args=(process.stderr, "STDERR", lines, encoding,
+                                   errors))
+        ]
+        for reader in readers:
+            reader.daemon = True
+            reader.start()
+        # Lines are logged from this thread only, the log level and step
+        # tracking is not thread safe.
+        open_pipes = len(readers)
+        while open_pipes:
+            pipe_tag, line = lines.get()
+            if line is None:
+                open_pipes -= 1
+                continue
+            line_tags = [pipe_tag]
+            append_to_tags(line_tags, tags)
+            set_log_parameters(line, current_level + 1, tags=line_tags)
+        for reader in readers:
+            reader.join()
+        exit_code = process.wait()
+        set_level(current_level)
+        return exit_code
+
+
+def _read_pipe(pipe, pipe_tag, lines, encoding, errors):
+    # Pipe reader thread for LogLevel.run_stream. Put each line read on the
+    # queue followed by None once the pipe is closed. The pipe is binary, the
+    # b"" sentinel never matches a text mode pipe (reads forever).
+    try:
+        for line in iter(pipe.readline, b""):
+            line = line.decode(encoding, errors).rstrip("\r\n")
+            lines.put((pipe_tag, line))
+    finally:
+        pipe.close()
+        lines.put((pipe_tag, None))
+
+
+def print_lines(content, log_level, tags=None):
+    """Print a python list or string containing newline characters
+    across multiple lines at the log level (the content of a block
+    without the title). When the output is redirected the lines are
+    written as a single batch.
+    """
+    with log_lock:
+        if isinstance(content, str):
+            content = content.split('\n')
+        write_block = getattr(sys.stdout, "block_writer", None)
+        if write_block is None or CONFIG["no-redirect"].value:
+            for msgLine in content:
+                set_log_parameters(msgLine, log_level, tags=tags)
+        else:
+            write_block(_block_records(content, log_level, tags))
+
+
+def _block_records(content, log_level, tags):
+    # Return the LogRecords for the content of a block. Each item is
+    # assigned the step and index that the output redirection would assign
+    # if the item was printed individually: items
+    # containing newline characters are split and each (non-empty) line
+    # takes a new step.
+    log_level = set_current_level(log_level)
+    set_tags(tags, log_level)
+    tags = MultiLevelLogging.tags
+    set_tags(None, None)
+    records = []
+    for item in content:
+        item = str(item)
+        step, index = get_next_step(log_level)
+        if "\n" not in item:
+            records.append(LogRecord(index, log_level, step, item, tags,
+                                     MultiLevelLogging.parent_indices))
+            continue
+        lines = [_f for _f in item.split("\n") if _f]
+        for i, line in enumerate(lines):
+            if i:
+                step, index = get_next_step(log_level)
+            records.append(LogRecord(index, log_level, step,
+                                     line.replace("\r", "").rstrip(), tags,
+                                     MultiLevelLogging.parent_indices))
+    return records
+
 
 def add_library_tag(f):
     def wrapper(*args, **kwargs):
@@ -214,17 +370,38 @@ def append_to_tags(original, new_tags):
 
 
 def set_tags(tags, log_level):
+    # The tags for a message are an immutable tuple shared by all messages
+    # with the same tags (and log level tag).
+    level_tag = LEVEL_TAGS.get(log_level)
     if tags is None:
-        tags = []
+        key = ((), level_tag)
     elif isinstance(tags, str):
+        key = (tags, level_tag)
+    else:
+        key = (tuple(tags), level_tag)
+    try:
+        MultiLevelLogging.tags = _interned_tags[key]
+    except KeyError:
+        MultiLevelLogging.tags = _intern_tags(key)
+    except TypeError:
+        # Unhashable tag
+        MultiLevelLogging.tags = _intern_tags(key, False)
+
+
+def _intern_tags(key, save=True):
+    tags, level_tag = key
+    if isinstance(tags, str):
         tags = tags.split(",")
-    if log_level in (TAG_TO_LEVEL["INFO"], TAG_TO_LEVEL["INFO"]+1):
-        tags.append("INFO")
-    elif log_level in (TAG_TO_LEVEL["DEBUG"], TAG_TO_LEVEL["DEBUG"]+1):
-        tags.append("DEBUG")
+    tags = list(tags)
+    if level_tag:
+        tags.append(level_tag)
     tags = [x.strip() for x in tags]  # strip each tag
-    tags = list(set(tags))  # remove duplicate tags
-    MultiLevelLogging.tags = tags
+    tags = tuple(OrderedDict.fromkeys(tags))  # remove duplicate tags
+    if save:
+        if len(_interned_tags) >= MAX_INTERNED_TAGS:
+            _interned_tags.clear()
+        _interned_tags[key] = tags
+    return tags
 
 
 def set_current_level(log_level):
@@ -244,25 +421,31 @@ def set_log_parameters(msg, log_level, message_type=None, tags=None):
     """Prepend the string to print with the log level and step before
     printing.
     """
-    if log_level is None:
-        log_level = MultiLevelLogging.current_level
-    valid_log_level = set_current_level(log_level)
-    if MultiLevelLogging.current_level == MIN_LEVEL:
-        MultiLevelLogging.current_min_level_msg = msg
-    step, index = get_next_step(valid_log_level)
-    MultiLevelLogging.log_level_set = True
-    MultiLevelLogging.message_type = message_type
-    set_tags(tags, valid_log_level)
-    if CONFIG["no-redirect"].value:
-        # Don't print index as it doesn't mean much in this situation
-        # (not every message is given an index)
-        print("{}-{} {}".format(valid_log_level, step, msg))
-    else:
-        # if the output redirect enabled
-        print(msg)
-    MultiLevelLogging.log_level_set = False
-    MultiLevelLogging.message_type = None
-    set_tags(None, None)
+    with log_lock:
+        if log_level is None:
+            log_level = MultiLevelLogging.current_level
+        valid_log_level = set_current_level(log_level)
+        if MultiLevelLogging.current_level == MIN_LEVEL:
+            MultiLevelLogging.current_min_level_msg = msg
+        redirected = (not CONFIG["no-redirect"].value and
+                      getattr(sys.stdout, "assigns_steps", False))
+        if not redirected:
+            step, index = get_next_step(valid_log_level)
+        MultiLevelLogging.log_level_set = True
+        MultiLevelLogging.message_type = message_type
+        set_tags(tags, valid_log_level)
+        if CONFIG["no-redirect"].value:
+            # Don't print index as it doesn't mean much in this situation
+            # (not every message is given an index)
+            print("{}-{} {}".format(valid_log_level, step, msg))
+        else:
+            # if the output redirect enabled. The redirection assigns the
+            # step and index of each line it does not drop (collapsed or
+            # rate limited).
+            print(msg)
+        MultiLevelLogging.log_level_set = False
+        MultiLevelLogging.message_type = None
+        set_tags(None, None)
 
 
 class MultiLevelLogging(object):
@@ -273,9 +456,41 @@ class MultiLevelLogging(object):
     current_step = [0] * (MAX_LEVEL - MIN_LEVEL + 1)
     log_level_set = False
     current_min_level_msg = None
-    parent_indices = [None] * (MAX_LEVEL - MIN_LEVEL + 1)
+    # Immutable, replaced (not modified) for each new message so it can be
+    # shared by the log records without copying.
+    parent_indices = (None,) * (MAX_LEVEL - MIN_LEVEL + 1)
     message_type = None
-    tags = []
+    tags = ()
+    # Monotonic clock timestamp (ns) of the most recently assigned step
+    current_time_ns = None
+
+
+class LogRecord(object):
+    """A log message with its assigned log level, step and index, held
+    before it is written to the database (block or buffered messages).
+    The tags and parent_indices tuples are shared, not copied. The
+    timestamp is that of the most recently assigned step.
+    """
+    __slots__ = ("index", "level", "step", "message", "tags",
+                 "parent_indices", "message_type", "parents", "time_ns",
+                 "repeat_count", "first_timestamp", "last_timestamp")
+
+    def __init__(self, index, level, step, message, tags, parent_indices,
+                 message_type=None, parents=None):
+        self.index = index
+        self.level = level
+        self.step = step
+        self.message = message
+        self.tags = tags
+        self.parent_indices = parent_indices
+        self.message_type = message_type
+        # ObjectIds of the parent messages in the database (flight recorder)
+        self.parents = parents
+        self.time_ns = MultiLevelLogging.current_time_ns
+        # Collapsed repeated messages
+        self.repeat_count = None
+        self.first_timestamp = None
+        self.last_timestamp = None
 
 
 def get_next_step(log_level):
@@ -286,12 +501,90 @@ def get_next_step(log_level):
     MultiLevelLogging.current_level = log_level
     MultiLevelLogging.current_index += 1
     i = index_from_level(log_level)
-    MultiLevelLogging.parent_indices[i] = MultiLevelLogging.current_index
-    for index in range(i+1, len(MultiLevelLogging.parent_indices)):
-        MultiLevelLogging.parent_indices[index] = None
+    MultiLevelLogging.parent_indices = (
+        MultiLevelLogging.parent_indices[:i] +
+        (MultiLevelLogging.current_index,) + _NO_PARENTS[i+1:]
+    )
+    now = monotonic_ns()
+    MultiLevelLogging.current_time_ns = now
+    if StepTimer.enabled:
+        _start_step_timer(i, MultiLevelLogging.current_index, log_level, step,
+                          now)
     return step, MultiLevelLogging.current_index
 
 
+def get_current_time_ns():
+    """Return the monotonic clock timestamp (ns) of the current message."""
+    return MultiLevelLogging.current_time_ns
+
+
+def wall_time(time_ns):
+    """Convert a monotonic clock timestamp (ns) to unix time."""
+    return _CLOCK_REFERENCE[0] + (time_ns - _CLOCK_REFERENCE[1]) / 1e9
+
+
+class StepTimer(object):
+    # Derive the duration of each log step from the message timestamps. A
+    # step lasts until the next message at the same or a higher (lower
+    # number) log level, i.e. its next sibling or the next sibling of a
+    # parent.
+    enabled = False
+    slowest_count = 10
+    # Save the duration of every step (log message), not just the slowest
+    save_all = False
+    # (index, level, step, start time) of the open step at each log level
+    open_steps = [None] * (MAX_LEVEL - MIN_LEVEL + 1)
+    deepest_open = -1
+    # (index, duration) of each completed step in the current test
+    durations = []
+    # Min heap of the slowest steps: (duration, index, level, step)
+    slowest = []
+
+
+def _start_step_timer(i, index, log_level, step, now):
+    # Complete the open steps at this level and lower levels (higher
+    # number) and start the timer for the new step.
+    open_steps = StepTimer.open_steps
+    for j in range(i, StepTimer.deepest_open + 1):
+        if open_steps[j] is not None:
+            _complete_step(open_steps[j], now)
+            open_steps[j] = None
+    open_steps[i] = (index, log_level, step, now)
+    StepTimer.deepest_open = i
+
+
+def _complete_step(open_step, now):
+    index, log_level, step, start = open_step
+    duration = now - start
+    if StepTimer.save_all:
+        StepTimer.durations.append((index, duration))
+    entry = (duration, index, log_level, step)
+    if len(StepTimer.slowest) < StepTimer.slowest_count:
+        heapq.heappush(StepTimer.slowest, entry)
+    elif StepTimer.slowest_count:
+        heapq.heappushpop(StepTimer.slowest, entry)
+
+
+def end_of_test_step_timers():
+    """Complete all open steps. Return the duration of each step (list of
+    index, duration tuples) and the slowest steps (list of duration, index,
+    log level, step tuples, slowest first) of the test and reset.
+    Durations are in nanoseconds.
+    """
+    with log_lock:
+        now = monotonic_ns()
+        for j, open_step in enumerate(StepTimer.open_steps):
+            if open_step is not None:
+                _complete_step(open_step, now)
+                StepTimer.open_steps[j] = None
+        StepTimer.deepest_open = -1
+        durations = StepTimer.durations
+        slowest = sorted(StepTimer.slowest, reverse=True)
+        StepTimer.durations = []
+        StepTimer.slowest = []
+    return durations, slowest
+
+
 def index_from_level(log_level):
     # Return the current_step list index for the log level specified.
     return log_level - MIN_LEVEL
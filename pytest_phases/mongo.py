@@ -11,15 +11,22 @@ from __future__ import division
 import copy
 import datetime
 import getpass
-import time
 from future import standard_library
 from builtins import object, range
-from pymongo import MongoClient
-from _pytest.runner import CallInfo
+from collections import OrderedDict
+from pymongo import MongoClient, UpdateOne
 from bson.objectid import ObjectId
-from .loglevels import MIN_LEVEL, MAX_LEVEL, get_parents, get_message_type
+from .loglevels import (
+    MIN_LEVEL,
+    MAX_LEVEL,
+    StepTimer,
+    get_current_time_ns,
+    get_parents,
+    get_message_type,
+    wall_time
+)
 from .verify import SessionStatus
-from .common import DEBUG, CONFIG
+from .common import DEBUG, CONFIG, DebugFlags
 from .common import debug_print as debug_print_common
 from .outcomes import hierarchy
 standard_library.install_aliases()
@@ -34,7 +41,8 @@ DROP_COLLECTIONS = False
 
 
 def debug_print(msg, prettify=None):
-    debug_print_common(msg, DEBUG["mongo"], prettify)
+    if DebugFlags.mongo:
+        debug_print_common(msg, DEBUG["mongo"], prettify)
 
 
 def _dummy_method(*args, **kwargs):
@@ -67,7 +75,7 @@ def insert_one_document(collection, document):
 @retry
 def update_one_document(collection, match, update, upsert=False):
     res = collection.update_one(match, update, upsert=upsert)
-    debug_print("Successfully matched {} and updated {} document(s)"
+    debug_print(lambda: "Successfully matched {} and updated {} document(s)"
                 .format(res.matched_count, res.modified_count))
 
 
@@ -82,6 +90,18 @@ def insert_many_documents(collection, documents):
     return res.inserted_ids
 
 
+@retry
+def bulk_write_documents(collection, requests):
+    res = collection.bulk_write(requests, ordered=False)
+    debug_print(lambda: "Successfully matched {} and updated {} document(s)"
+                .format(res.matched_count, res.modified_count))
+
+
+def log_timestamp(time_ns):
+    # Return the (UTC) datetime of a log message monotonic clock timestamp.
+    return datetime.datetime.utcfromtimestamp(wall_time(time_ns))
+
+
 class MongoConnector(object):
     parents = ["-"] * (MAX_LEVEL - MIN_LEVEL + 1)
 
@@ -114,6 +134,14 @@ class MongoConnector(object):
             self.test_oid = None
             self.fix_oid = []
             self.link_oid = None
+            # Log message ObjectIds of the current test by index (only if the
+            # duration of every log step is saved)
+            self.log_oids = {}
+            # Log messages (by ObjectId) and the number of children to add
+            # to each parent message held within verify_batch (None if not
+            # in a batch)
+            self.log_batch = None
+            self.log_batch_children = None
             self.run_order_oid = None
 
             self.device_configs = None
@@ -387,7 +415,8 @@ class MongoConnector(object):
                 overall="pending"
             ),
             callVerifications=[],
-            callSummary={}
+            callSummary={},
+            durationsNs={}
         )
         self.test_oid = insert_one_document(self.db.testresults, test_result)
         # TODO enhancement embed logs until document becomes large?
@@ -447,7 +476,7 @@ class MongoConnector(object):
             raise AssertionError("Unknown fixture scope {}".format(scope))
         update_one_document(collection, match, update)
 
-    def update_fixture_setup(self, name, outcome, summary):
+    def update_fixture_setup(self, name, outcome, summary, duration=None):
         # Update session active setups and progress.completed (fixture setup)
         match = {"_id": self.session_oid}
         update = {
@@ -473,9 +502,10 @@ class MongoConnector(object):
         # check fixture in expected "fixtures" list?
         # FIXME is this even required?
 
-        # Update fixture: setupOutcome
+        # Update fixture: setupOutcome and setupDurationNs
         match = {"_id": self.fix_oid[-1]}
-        update = {"$set": {"setupOutcome": outcome}}
+        update = {"$set": {"setupOutcome": outcome,
+                           "setupDurationNs": duration}}
         update_one_document(self.db.fixtures, match, update)
 
         # For fixture setup update the current test (first test associated
@@ -487,16 +517,16 @@ class MongoConnector(object):
         # TODO If progress.activeSetups
         for test_oid in test_oids:
             doc = find_one_document(self.db.testresults, {"_id": test_oid})
-            debug_print("{} - {} outcome initial: {}".format(
+            debug_print(lambda: "{} - {} outcome initial: {}".format(
                         doc["testName"], phase, doc["outcome"][phase]))
             # Check if the phase outcome requires updating.
-            debug_print("comparing with fixture outcome: {}"
+            debug_print(lambda: "comparing with fixture outcome: {}"
                         .format(fixture_outcome))
             phase_outcome = doc["outcome"][phase]
             initial_index = hierarchy.index(phase_outcome)
-            debug_print("Initial index = {}".format(initial_index))
+            debug_print(lambda: "Initial index = {}".format(initial_index))
             if hierarchy.index(fixture_outcome) < initial_index:
-                debug_print("{} outcome update required"
+                debug_print(lambda: "{} outcome update required"
                             .format(phase.capitalize()))
                 phase_outcome = fixture_outcome
                 update_phase_outcome = True
@@ -506,7 +536,7 @@ class MongoConnector(object):
             # Update the overall outcome, compare all phases. Note that this
             # checks the current fixture setup outcome against the current
             # cumulative setup outcome.
-            debug_print("Phase outcomes:", prettify={
+            debug_print("Phase outcomes:", prettify=lambda: {
                 "setup": doc["outcome"]["setup"],
                 "call": doc["outcome"]["call"],
                 phase: phase_outcome  # could overwrite setup entry above
@@ -515,8 +545,8 @@ class MongoConnector(object):
                                 hierarchy.index(doc["outcome"]["call"]),
                                 hierarchy.index(phase_outcome))
             overall_outcome = hierarchy[overall_index]
-            debug_print("Overall outcome: {} [{}]".format(overall_outcome,
-                                                          overall_index))
+            debug_print(lambda: "Overall outcome: {} [{}]".format(
+                overall_outcome, overall_index))
             # Update testresult outcome
             match = dict(_id=test_oid)
             update = {"$set": {"outcome.overall": overall_outcome}}
@@ -526,8 +556,8 @@ class MongoConnector(object):
             if phase == "teardown" and tests_complete:
                 update["$set"]["status"] = "complete"
 
-            debug_print("Updating testresult.outcome.overall (and {} if req)"
-                        .format(phase))
+            debug_print(lambda: "Updating testresult.outcome.overall (and {} "
+                        "if req)".format(phase))
             update_one_document(self.db.testresults, match, update)
 
             # Update session.runOrder (Uses _id link in associated testresult).
@@ -568,7 +598,8 @@ class MongoConnector(object):
             test_oids = [self.test_oid]
         return test_oids
 
-    def update_fixture_teardown(self, name, outcome, summary, scope):
+    def update_fixture_teardown(self, name, outcome, summary, scope,
+                                duration=None):
         match = {"_id": self.session_oid}
         # session progress
         update_session = {
@@ -612,9 +643,10 @@ class MongoConnector(object):
 
         update_one_document(self.db.sessions, match, update_session)
 
-        # Update fixture: teardownOutcome
+        # Update fixture: teardownOutcome and teardownDurationNs
         match = {"_id": self.fix_oid.pop()}
-        update = {"$set": {"teardownOutcome": outcome}}
+        update = {"$set": {"teardownOutcome": outcome,
+                           "teardownDurationNs": duration}}
         update_one_document(self.db.fixtures, match, update)
 
         test_oids = self._get_test_oids_in_fixture_scope(scope)
@@ -642,7 +674,8 @@ class MongoConnector(object):
 
         # TODO Update session.runOrder to passed is is still pending
 
-    def update_test_phase_complete(self, completed_phase, outcome, summary):
+    def update_test_phase_complete(self, completed_phase, outcome, summary,
+                                   duration=None):
         # Update the parent session progress
         match = {"_id": self.session_oid}
         update = {
@@ -661,8 +694,8 @@ class MongoConnector(object):
                 )
             }
         }
-        debug_print_common("Update whole structure of progress.completed ("
-                           "workaround)", DEBUG["dev"])
+        debug_print_common("Update whole structure of progress.completed "
+                           "(workaround)", DEBUG["dev"])
         # For tests that have no fixtures the phase outcomes, overall
         # outcome and status (complete) need to be set here.
         update_one_document(self.db.sessions, match, update)
@@ -683,12 +716,19 @@ class MongoConnector(object):
             if "$set" not in update.keys():
                 update["$set"] = dict()
             update["$set"]["runOrder.$.outcome"] = overall_outcome
-            debug_print("Updating session.runOrder outcome to {}"
+            debug_print(lambda: "Updating session.runOrder outcome to {}"
                         .format(overall_outcome))
         if completed_phase == "teardown" and not SessionStatus.active_setups:
             if "$set" not in update.keys():
                 update["$set"] = dict()
             update["$set"]["runOrder.$.status"] = "complete"
+        if completed_phase == "teardown" and duration is not None:
+            # Total of the setup, call and teardown durations (seconds)
+            test_duration = duration + sum(doc.get("durationsNs", {})
+                                           .values())
+            if "$set" not in update.keys():
+                update["$set"] = dict()
+            update["$set"]["runOrder.$.duration"] = test_duration / 1e9
         if update:
             update_one_document(self.db.sessions, match, update)
 
@@ -701,6 +741,9 @@ class MongoConnector(object):
                 # TODO update callSummary?
             }
         }
+        if duration is not None:
+            update["$set"]["durationsNs.{}".format(completed_phase)] = \
+                duration
         if completed_phase == "teardown" and not SessionStatus.active_setups:
             update["$set"]["status"] = "complete"
         update_one_document(self.db.testresults, match, update)
@@ -738,8 +781,10 @@ class MongoConnector(object):
         return chunks
 
     def bulk_insert_log_messages(self, msgs_log_params):
+        # Messages held by a batch are inserted first (parents)
+        self.flush_log_batch()
         # log level is same for all these messages
-        log_level = msgs_log_params[0]["level"]
+        log_level = msgs_log_params[0].level
 
         log_chunks = self.split_to_chunks_at_write_limit(msgs_log_params)
         for chunk in log_chunks:
@@ -751,24 +796,27 @@ class MongoConnector(object):
                         moduleName=SessionStatus.module,
                         className=SessionStatus.class_name,
                         testName=SessionStatus.test_function,
-                        index=msg["index"],
-                        level=msg["level"],
+                        index=msg.index,
+                        level=msg.level,
                         minLevel=MIN_LEVEL,
                         maxLevel=MAX_LEVEL,
-                        step=msg["step"],
-                        message=escape_html(msg["message"]),
+                        step=msg.step,
+                        message=escape_html(msg.message),
                         parents=MongoConnector.parents[:log_level - MIN_LEVEL],
-                        parentIndices=msg["parent_indices"],
+                        parentIndices=msg.parent_indices,
                         numOfChildren=0,
-                        # FIXME use time.time() instead
-                        timestamp=datetime.datetime.utcnow(),
+                        timestamp=log_timestamp(msg.time_ns),
+                        timestampNs=msg.time_ns,
                         testResult=self.test_oid,
-                        tags=msg["tags"],
+                        tags=msg.tags,
                         type=get_message_type()
                     )
                 )
 
             inserted_ids = insert_many_documents(self.db.testlogs, docs)
+            if StepTimer.save_all:
+                for msg, inserted_id in zip(chunk, inserted_ids):
+                    self.log_oids[msg.index] = inserted_id
             # Update self.db.loglinks with the ObjectId of this message entry
             update_one_document(self.db.loglinks, {"_id": self.link_oid},
                                 {"$push": {"logIds": {"$each": inserted_ids}}})
@@ -784,6 +832,94 @@ class MongoConnector(object):
         for i in range(log_level-MIN_LEVEL+1, len(MongoConnector.parents)):
             MongoConnector.parents[i] = "-"
 
+    def get_log_parents(self, level):
+        """
+        Return a copy of the current parent log message ObjectIds for a
+        message at the specified log level. Used to hold the parents of
+        messages that are inserted later (flight recorder).
+        :param level: The log level.
+        :return: list of parent ObjectIds ("-" if no parent at a level).
+        """
+        return MongoConnector.parents[:level - MIN_LEVEL]
+
+    def insert_buffered_log_messages(self, records):
+        """
+        Insert log messages previously held by the flight recorder.
+        Parents that were also buffered are resolved using the parent
+        indices of each message, other parents use the ObjectIds copied
+        when the message was buffered. A parent index of None (e.g. the
+        parent was not saved) has no parent. The numOfChildren of the
+        parents is updated. The current list of possible parents
+        (MongoConnector.parents) is not modified as buffered messages are
+        always at a higher log level than the messages inserted directly.
+        :param records: list of buffered log messages (LogRecord).
+        """
+        self.flush_log_batch()
+        buffered_oids = {}
+        docs = []
+        inc_children = OrderedDict()
+        for record in records:
+            level = record.level
+            parents = []
+            for i, parent in enumerate(record.parents):
+                parent_index = record.parent_indices[i]
+                if parent_index in buffered_oids:
+                    parents.append(buffered_oids[parent_index])
+                elif parent_index is None:
+                    parents.append("-")
+                else:
+                    parents.append(parent)
+            doc = dict(
+                _id=ObjectId(),
+                sessionId=self.session_id,
+                moduleName=SessionStatus.module,
+                className=SessionStatus.class_name,
+                testName=SessionStatus.test_function,
+                index=record.index,
+                level=level,
+                minLevel=MIN_LEVEL,
+                maxLevel=MAX_LEVEL,
+                step=record.step,
+                message=escape_html(record.message),
+                parents=parents,
+                parentIndices=record.parent_indices,
+                numOfChildren=0,
+                timestamp=log_timestamp(record.time_ns),
+                timestampNs=record.time_ns,
+                testResult=self.test_oid,
+                tags=record.tags,
+                type=record.message_type
+            )
+            if record.repeat_count is not None:
+                doc.update(repeatCount=record.repeat_count,
+                           firstTimestamp=record.first_timestamp,
+                           lastTimestamp=record.last_timestamp)
+            buffered_oids[record.index] = doc["_id"]
+            if StepTimer.save_all:
+                self.log_oids[record.index] = doc["_id"]
+            docs.append(doc)
+            for parent_id in parents:
+                if parent_id != "-":
+                    inc_children[parent_id] = inc_children.get(parent_id,
+                                                               0) + 1
+
+        # Children of buffered messages are counted before insertion,
+        # children of existing messages are updated afterwards.
+        docs_by_oid = {doc["_id"]: doc for doc in docs}
+        for parent_id in list(inc_children.keys()):
+            if parent_id in docs_by_oid:
+                docs_by_oid[parent_id]["numOfChildren"] = inc_children.pop(
+                    parent_id)
+
+        for chunk in self.split_to_chunks_at_write_limit(docs):
+            inserted_ids = insert_many_documents(self.db.testlogs, chunk)
+            update_one_document(self.db.loglinks, {"_id": self.link_oid},
+                                {"$push": {"logIds": {"$each": inserted_ids}}})
+        for parent_id, children in inc_children.items():
+            update_one_document(self.db.testlogs,
+                                {"_id": parent_id},
+                                {"$inc": {"numOfChildren": children}})
+
     def insert_log_message(self, index, level, step, message, tags):
         """
         Insert a log message to the testlogs collection. Insert the
@@ -796,10 +932,11 @@ class MongoConnector(object):
         :param level: The log level.
         :param step: The current log step for the assigned level.
         :param message: The log message.
-        :return:
+        :return: The ObjectId of the inserted message.
         """
         # TODO add? SessionStatus.class_name, SessionStatus.module,
         # SessionStatus.test_function, SessionStatus.test_fixtures
+        time_ns = get_current_time_ns()
         msg = dict(
             sessionId=self.session_id,
             moduleName=SessionStatus.module,
@@ -814,22 +951,35 @@ class MongoConnector(object):
             parents=MongoConnector.parents[:level - MIN_LEVEL],
             parentIndices=get_parents(),
             numOfChildren=0,
-            timestamp=datetime.datetime.utcnow(),  # FIXME use time.time() instead
+            timestamp=log_timestamp(time_ns),
+            timestampNs=time_ns,
             testResult=self.test_oid,
             tags=tags,
             type=get_message_type()
         )
-        # Insert the log message
-        inserted_id = insert_one_document(self.db.testlogs, msg)
-        # Update self.db.loglinks with the ObjectId of this message entry
-        update_one_document(self.db.loglinks,
-                            {"_id": self.link_oid},
-                            {"$push": {"logIds": inserted_id}})
-        # Update parent entries in the db: increment the number of children
-        for parent_id in MongoConnector.parents[:level - MIN_LEVEL]:
-            update_one_document(self.db.testlogs,
-                                {"_id": parent_id},
-                                {"$inc": {"numOfChildren": 1}})
+        if self.log_batch is not None:
+            # Held until the end of the batch
+            inserted_id = msg["_id"] = ObjectId()
+            self.log_batch[inserted_id] = msg
+            for parent_id in msg["parents"]:
+                if parent_id != "-":
+                    self.log_batch_children[parent_id] = \
+                        self.log_batch_children.get(parent_id, 0) + 1
+        else:
+            # Insert the log message
+            inserted_id = insert_one_document(self.db.testlogs, msg)
+            # Update self.db.loglinks with the ObjectId of this message entry
+            update_one_document(self.db.loglinks,
+                                {"_id": self.link_oid},
+                                {"$push": {"logIds": inserted_id}})
+            # Update parent entries in the db: increment the number of
+            # children
+            for parent_id in MongoConnector.parents[:level - MIN_LEVEL]:
+                update_one_document(self.db.testlogs,
+                                    {"_id": parent_id},
+                                    {"$inc": {"numOfChildren": 1}})
+        if StepTimer.save_all:
+            self.log_oids[index] = inserted_id
         # Update the list of possible parents to include the inserted message
         # Add inserted _id for the relevant log level
         MongoConnector.parents[level - MIN_LEVEL] = inserted_id
@@ -838,6 +988,131 @@ class MongoConnector(object):
         # by more than 1.
         for i in range(level-MIN_LEVEL+1, len(MongoConnector.parents)):
             MongoConnector.parents[i] = "-"
+        return inserted_id
+
+    def update_log_repeats(self, log_oid, repeats, first_time, last_time):
+        """
+        Update a log message that was repeated consecutively with the
+        number of repeats (not including the original message) and the
+        unix time of the first and last occurrences.
+        :param log_oid: ObjectId of the original log message.
+        :param repeats: The number of repeated messages collapsed.
+        :param first_time: Time of the original message.
+        :param last_time: Time of the last repeated message.
+        """
+        update = {
+            "repeatCount": repeats,
+            "firstTimestamp": first_time,
+            "lastTimestamp": last_time
+        }
+        if self.log_batch and log_oid in self.log_batch:
+            self.log_batch[log_oid].update(update)
+        else:
+            update_one_document(self.db.testlogs, {"_id": log_oid},
+                                {"$set": update})
+
+    def start_log_batch(self):
+        """
+        Hold the log messages inserted by insert_log_message until the end
+        of the batch (verify_batch).
+        """
+        self.log_batch = OrderedDict()
+        self.log_batch_children = OrderedDict()
+
+    def flush_log_batch(self):
+        """
+        Insert the log messages held by the current batch (if any) with a
+        single insert, a single update of the log links and a single bulk
+        update of the number of children of the parent messages.
+        """
+        if not self.log_batch:
+            return
+        docs = self.log_batch
+        children = self.log_batch_children
+        self.start_log_batch()
+        # Children of held messages are counted before insertion, children
+        # of existing messages are updated afterwards.
+        for parent_id in list(children.keys()):
+            if parent_id in docs:
+                docs[parent_id]["numOfChildren"] = children.pop(parent_id)
+        for chunk in self.split_to_chunks_at_write_limit(list(docs.values())):
+            inserted_ids = insert_many_documents(self.db.testlogs, chunk)
+            update_one_document(self.db.loglinks, {"_id": self.link_oid},
+                                {"$push": {"logIds": {"$each": inserted_ids}}})
+        if children:
+            bulk_write_documents(self.db.testlogs, [
+                UpdateOne({"_id": parent_id},
+                          {"$inc": {"numOfChildren": count}})
+                for parent_id, count in children.items()
+            ])
+
+    def end_log_batch(self):
+        """
+        Insert the log messages held by the batch and stop holding them.
+        """
+        self.flush_log_batch()
+        self.log_batch = None
+        self.log_batch_children = None
+
+    def update_log_durations(self, durations, slowest):
+        """
+        Save a summary of the slowest steps to the test result and update
+        the log messages of the current test with the duration of the step
+        (by ObjectId, if the durations of all steps are saved).
+        :param durations: list of (index, duration) tuples, empty unless the
+        durations of all steps are saved.
+        :param slowest: list of (duration, index, level, step) tuples,
+        slowest first.
+        Durations are in nanoseconds.
+        """
+        self.flush_log_batch()
+        log_oids = self.log_oids
+        self.log_oids = {}
+        # Messages not inserted (discarded by the flight recorder or diverted
+        # to the overflow file) have no ObjectId.
+        requests = [
+            UpdateOne({"_id": log_oids[index]},
+                      {"$set": {"durationNs": duration}})
+            for index, duration in durations if index in log_oids
+        ]
+        for chunk in self.split_to_chunks_at_write_limit(requests):
+            bulk_write_documents(self.db.testlogs, chunk)
+        update_one_document(self.db.testresults, {"_id": self.test_oid}, {
+            "$set": {
+                "slowestSteps": [
+                    dict(index=index, level=level, step=step,
+                         durationNs=duration)
+                    for duration, index, level, step in slowest
+                ]
+            }
+        })
+
+    def update_test_log_overflow(self, path, lines, size):
+        """
+        Link the log overflow file of the current test (messages diverted
+        once the per test log budget was exceeded) to the test result.
+        :param path: Path to the compressed overflow file.
+        :param lines: The number of lines written to the file.
+        :param size: The number of bytes written to the file (before
+        compression).
+        """
+        update_one_document(self.db.testresults, {"_id": self.test_oid}, {
+            "$set": {
+                "logOverflow": dict(
+                    file=path,
+                    lines=lines,
+                    bytes=size
+                )
+            }
+        })
+
+    def update_test_profile(self, path):
+        """
+        Link the CPU profile of the current test to the test result.
+        :param path: Path to the profile (pstats) file.
+        """
+        update_one_document(self.db.testresults, {"_id": self.test_oid},
+                            {"$set": {"profile": path}})
 
     def insert_verification(self, saved_result):
         """
@@ -851,6 +1126,16 @@ class MongoConnector(object):
         :param saved_result: The saved verification (pass/warn/fail) or
         caught assertion.
         """
+        return self.insert_verifications(
+            [self.prepare_verification(saved_result)])[0]
+
+    def prepare_verification(self, saved_result):
+        """
+        Create the verification (and traceback) documents for a saved
+        verification and find its parent document without writing to the
+        database. The ObjectIds are assigned here.
+        :return: Prepared verification for insert_verifications.
+        """
         if saved_result.traceback_link:
             # Traceback doc currently mirrors data in the verification
             # doc.
@@ -862,46 +1147,33 @@ class MongoConnector(object):
             # from the plugin rather than the original source.
             tb = []
             for level in saved_result.traceback_link.formatted_traceback:
-                # Workaround for https://github.com/pytest-dev/pytest/pull/3560
-                locals_fixed = []
-                for k, v in level["locals"].items():
-                    if isinstance(v, CallInfo):
-                        if not hasattr(v, "result"):
-                            # CallInfo type object with no results attribute
-                            # FIXME create a pytest debug field
-                            debug_print_common("Error: Found CallInfo with no "
-                                               "result attribute (workaround)",
-                                               DEBUG["dev"])
-                            locals_fixed.append("{}: Error: CallInfo with no "
-                                                "result attribute".format(k))
-                        else:
-                            locals_fixed.append("{} :{}".format(k, v))
-
+                # Locals are saved as strings (serialize_locals) so the
+                # workaround for https://github.com/pytest-dev/pytest/pull/3560
+                # (CallInfo with no result attribute) is no longer required.
                 tb.append(dict(
                     location=level['location'],
                     code=level['code'],
-                    # TODO restore when above defect is fixed
-                    # locals=["{}:{}".format(k, v) for k, v in level['locals']
-                    #         .items()],
-                    locals=locals_fixed
+                    locals=["{}:{}".format(k, v) for k, v in level['locals']
+                            .items()]
                     )
                 )
             exc_type = saved_result.traceback_link.exc_type.__name__
             traceback = dict(
+                _id=ObjectId(),
                 type=exc_type,
                 tb=tb
             )
-            verify_oid = insert_one_document(self.db.tracebacks, traceback)
+            verify_oid = traceback["_id"]
         else:
+            traceback = None
             exc_type = None
             verify_oid = None
 
-        # Get the current unix time
-        time_stamp = time.time()
-
         verify = dict(
-            timestamp=time_stamp,  # FIXME this is not the
-            # same as the timestamp saved with the log message
+            _id=ObjectId(),
+            # Same clock as the log message timestamps
+            timestamp=wall_time(saved_result.time_ns),
+            timestampNs=saved_result.time_ns,
             level1Msg=saved_result.step,
             verifyMsg=saved_result.msg,
             indexMsg=saved_result.message_index,
@@ -926,11 +1198,12 @@ class MongoConnector(object):
             scope=saved_result.scope,
             activeSetups=saved_result.active
         )
+        if saved_result.details:
+            # verify_all counts and failing indices/values
+            verify["details"] = saved_result.details
         # TODO add defect and analysis if required
 
-        # Update parent testresult or fixture (setup or teardown):
-        # 1. add embedded verification document
-        # 2. increment the verification type counter
+        # Parent testresult or fixture (setup or teardown)
         if (saved_result.phase in ("setup", "teardown") and
                 saved_result.fixture_name and self.fix_oid):
             collection = self.db.fixtures
@@ -947,20 +1220,54 @@ class MongoConnector(object):
                                  self.fix_oid[-1],
                                  saved_result.test_function,
                                  self.test_oid)
-        verification_oid = insert_one_document(self.db.verifications, verify)
+        return saved_result, traceback, verify, collection, doc_oid
 
-        match = {"_id": doc_oid}
-        update = {
-            "$push": {
-                "{}Verifications".format(saved_result.phase):
-                    verification_oid},
-             "$inc": {
-                 "{}Summary.{}".format(saved_result.phase,
-                                       saved_result.type_code): 1
-             }
-        }
-        update_one_document(collection, match, update)
+    def insert_verifications(self, prepared):
+        """
+        Insert verifications prepared by prepare_verification with a single
+        insert of the tracebacks and verifications and a single update of
+        each parent document.
+        :return: The verification ObjectIds.
+        """
+        tracebacks = [traceback for _, traceback, _, _, _ in prepared
+                      if traceback]
+        if tracebacks:
+            insert_many_documents(self.db.tracebacks, tracebacks)
+        insert_many_documents(self.db.verifications,
+                              [verify for _, _, verify, _, _ in prepared])
+
+        # Update parent testresult or fixture (setup or teardown):
+        # 1. add embedded verification document
+        # 2. increment the verification type counter
+        parent_updates = OrderedDict()
+        for saved_result, _, verify, collection, doc_oid in prepared:
+            key = (collection.name, doc_oid)
+            if key not in parent_updates:
+                parent_updates[key] = (collection, OrderedDict(), {})
+            pushes, increments = parent_updates[key][1:]
+            pushes.setdefault("{}Verifications".format(saved_result.phase),
+                              []).append(verify["_id"])
+            summary = "{}Summary.{}".format(saved_result.phase,
+                                            saved_result.type_code)
+            increments[summary] = increments.get(summary, 0) + 1
+        requests = OrderedDict()
+        for (name, doc_oid), (collection, pushes, increments) in \
+                parent_updates.items():
+            update = {
+                "$push": {field: {"$each": oids}
+                          for field, oids in pushes.items()},
+                "$inc": increments
+            }
+            requests.setdefault(name, (collection, []))[1].append(
+                UpdateOne({"_id": doc_oid}, update))
+        for collection, collection_requests in requests.values():
+            bulk_write_documents(collection, collection_requests)
+
+        for saved_result, _, verify, _, _ in prepared:
+            self._update_failure_result(saved_result, verify)
+        return [verify["_id"] for _, _, verify, _, _ in prepared]
 
+    def _update_failure_result(self, saved_result, verify):
         # If the current verification result (exclude "P" passes) is higher
         # in the failure outcome hierarchy update the failure reason in the
         # session.runOrder for the corresponding test (last element of
@@ -978,17 +1285,54 @@ class MongoConnector(object):
                          "runOrder._id": self.run_order_oid}
                 update = {
                     "$set": {
-                        "runOrder.$.excMsg": "{}: {}".format(exc_type,
-                                                             saved_result.msg),
+                        "runOrder.$.excMsg": "{}: {}".format(
+                            verify["excType"], saved_result.msg),
                         "runOrder.$.excSource": saved_result.source[
                             "module-function-line"],
-                        "runOrder.$.verify_id": verification_oid
+                        "runOrder.$.verify_id": verify["_id"]
                     }
                 }
                 update_one_document(self.db.sessions, match, update)
         # TODO add failure reason to to the saved Result object
 
-        return verification_oid
+    def update_session_call_sites(self, most_executed, most_time):
+        """
+        Save the verify call site statistics to the session.
+        :param most_executed: list of call site dicts, most calls first.
+        :param most_time: list of call site dicts, most time first.
+        """
+        update_one_document(self.db.sessions, dict(_id=self.session_oid),
+                            {"$set": {"verifyCallSites": dict(
+                                mostExecuted=most_executed,
+                                mostTime=most_time)}})
+
+    def update_session_durations(self, tests, fixtures):
+        """
+        Save the slowest tests and fixtures to the session.
+        :param tests: list of test duration dicts, slowest first.
+        :param fixtures: list of fixture setup/teardown duration dicts,
+        slowest first.
+        """
+        update_one_document(self.db.sessions, dict(_id=self.session_oid),
+                            {"$set": {"slowestTests": tests,
+                                      "slowestFixtures": fixtures}})
+
+    def update_session_fixture_profile(self, most_costly, candidates,
+                                       reinstantiated):
+        """
+        Save the fixture profile to the session.
+        :param most_costly: list of fixture profile dicts, most costly
+        (total setup and teardown time) first.
+        :param candidates: function scoped fixture profiles that are
+        candidates for a wider scope.
+        :param reinstantiated: fixture profiles of the fixtures set up more
+        than once per module or class.
+        """
+        update_one_document(self.db.sessions, dict(_id=self.session_oid),
+                            {"$set": {"fixtureProfile": dict(
+                                mostCostly=most_costly,
+                                widerScopeCandidates=candidates,
+                                reinstantiated=reinstantiated)}})
 
     def update_session_complete(self):
         update_one_document(self.db.sessions, dict(_id=self.session_oid),
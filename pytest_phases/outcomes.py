@@ -77,6 +77,14 @@ hierarchy = (
     Outcomes.pending
     # TODO what about call phases that aren't run?
 )
+# Position of each outcome in the hierarchy (lower is more severe)
+outcome_rank = {outcome: i for i, outcome in enumerate(hierarchy)}
+
+
+def worst_outcome(*outcomes):
+    # Return the highest outcome in the hierarchy (pending if none).
+    return hierarchy[min([outcome_rank[outcome] for outcome in outcomes] +
+                         [len(hierarchy) - 1])]
 
 _plurals = {
     Outcomes.setup_skip: "setups skipped",
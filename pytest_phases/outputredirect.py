@@ -8,24 +8,32 @@
 #         2. pytest output that fills console width stretches to 2
 #            lines after the addition on log level etc.
 from __future__ import absolute_import
+import ctypes
+import gzip
 import json
 import logging
 import os
 import re
 import sys
+import threading
+import time
 from builtins import object, str
-from collections import OrderedDict
+from collections import OrderedDict, deque
 from .common import CONFIG
 from .loglevels import (
+    LogRecord,
+    StepTimer,
+    end_of_test_step_timers,
     get_current_level,
-    get_current_step,
     get_step_for_level,
     increment_level,
     is_level_set,
     set_level,
+    get_message_type,
     get_parents,
     set_log_parameters,
     get_tags,
+    log_lock,
     set_tags
 )
 from .verify import SessionStatus
@@ -51,6 +59,362 @@ class LogRedirect(object):
         return False
 
 
+class FlightRecorder(object):
+    """Bounded (ring) buffer of verbose log messages for the current test.
+    Messages at or above min_level are held here instead of being written
+    to the console and the database. The buffer is flushed to both if the
+    test does not pass, otherwise it is discarded.
+    Messages logged outside of a test (e.g. module and session summaries)
+    are never held.
+    Saved messages whose parent message was not saved (dropped from the
+    buffer or discarded with an earlier test phase) have no parent link
+    at that level.
+    """
+    def __init__(self, min_level, size):
+        self.min_level = min_level
+        self.records = deque(maxlen=size)
+        self.overflowed = 0
+        self.active = False
+        # Indices of the messages of the current test that were not saved
+        self.unsaved = set()
+
+    def start(self):
+        self.active = True
+        self.unsaved.clear()
+
+    def captures(self, level):
+        return self.active and level >= self.min_level
+
+    def record(self, msg, level, step, index, tags):
+        # The step, index and parents are those assigned when the message
+        # was logged so flushed messages slot into the log tree.
+        return self.add(LogRecord(index, level, step, msg, tags,
+                                  get_parents(),
+                                  message_type=get_message_type()))
+
+    def add(self, record):
+        if len(self.records) == self.records.maxlen:
+            self.overflowed += 1
+            self.unsaved.add(self.records[0].index)
+        record.parents = SessionStatus.mongo.get_log_parents(record.level)
+        self.records.append(record)
+        return record
+
+    def flush(self, redirect):
+        if self.records:
+            redirect.write_to_stdout(
+                "Flight recorder: saving {} buffered messages ({} older "
+                "messages discarded)\n".format(len(self.records),
+                                                self.overflowed)
+            )
+            for record in self.records:
+                redirect.write_log_to_console(
+                    record.message, record.level, record.step, record.index,
+                    record.tags
+                )
+            for record in self.records:
+                if self.unsaved.intersection(record.parent_indices):
+                    record.parent_indices = tuple(
+                        None if parent in self.unsaved else parent
+                        for parent in record.parent_indices)
+            SessionStatus.mongo.insert_buffered_log_messages(
+                list(self.records))
+        self.records.clear()
+        self.overflowed = 0
+
+    def discard(self):
+        self.unsaved.update(record.index for record in self.records)
+        self.records.clear()
+        self.overflowed = 0
+
+
+class RepeatedLineFilter(object):
+    """Collapse consecutive identical messages (same message, log level and
+    tags) into the first message. The first message is written as normal
+    and updated with the repeat count and first and last timestamps once
+    a different message is written (or the test completes).
+    """
+    def __init__(self):
+        self.last = None
+        self.sink_ref = None
+        self.repeats = 0
+        self.first_time = None
+        self.last_time = None
+
+    def is_repeat(self, msg, level, tags):
+        if self.last is not None and self.last == (msg, level, tags):
+            self.repeats += 1
+            self.last_time = time.time()
+            return True
+        return False
+
+    def start(self, msg, level, tags, sink_ref):
+        self.last = (msg, level, tags)
+        self.sink_ref = sink_ref
+        self.first_time = time.time()
+
+    def end(self, redirect):
+        # No update if the first message was diverted to the log budget
+        # overflow file.
+        diverted = (redirect.log_budget is not None and
+                    redirect.log_budget.overflow is not None)
+        if self.repeats and not diverted:
+            msg, level, tags = self.last
+            if isinstance(self.sink_ref, LogRecord):
+                # First message is held by the flight recorder
+                self.sink_ref.repeat_count = self.repeats
+                self.sink_ref.first_timestamp = self.first_time
+                self.sink_ref.last_timestamp = self.last_time
+            elif self.sink_ref is not None:
+                SessionStatus.mongo.update_log_repeats(
+                    self.sink_ref, self.repeats, self.first_time,
+                    self.last_time)
+            if (CONFIG["terminal-max-level"].value is None or
+                    level <= CONFIG["terminal-max-level"].value):
+                redirect.write_to_stdout(
+                    "Previous message repeated {} more times (last at {})\n"
+                    .format(self.repeats, time.strftime(
+                        "%H:%M:%S", time.localtime(self.last_time)))
+                )
+        self.__init__()
+
+
+class LineRateLimiter(object):
+    """Limit the number of lines logged per second for the current test.
+    Lines in excess of the limit are dropped and summarized by a single
+    message once the one second window has elapsed (or the test
+    completes).
+    """
+    def __init__(self, lines_per_second):
+        self.limit = lines_per_second
+        self.window_start = 0
+        self.window_lines = 0
+        self.suppressed = 0
+        self.suppressed_bytes = 0
+        self.first_time = None
+        self.last_time = None
+
+    def check(self, msg):
+        # Return a tuple: True if the line exceeds the limit and should be
+        # dropped, and the summary of lines dropped in the previous window
+        # (None if no lines were dropped).
+        now = time.time()
+        summary = None
+        if now - self.window_start >= 1:
+            summary = self.summary()
+            self.window_start = now
+            self.window_lines = 0
+        self.window_lines += 1
+        if self.window_lines > self.limit:
+            if not self.suppressed:
+                self.first_time = now
+            self.suppressed += 1
+            self.suppressed_bytes += len(msg)
+            self.last_time = now
+            return True, summary
+        return False, summary
+
+    def summary(self):
+        # Return the summary message for suppressed lines (if any) and reset
+        # the count.
+        if not self.suppressed:
+            return None
+        msg = ("Log rate limit ({} lines per second) exceeded: {} lines ({} "
+               "bytes) suppressed between {} and {}".format(
+                   self.limit, self.suppressed, self.suppressed_bytes,
+                   time.strftime("%H:%M:%S", time.localtime(self.first_time)),
+                   time.strftime("%H:%M:%S", time.localtime(self.last_time))))
+        self.suppressed = 0
+        self.suppressed_bytes = 0
+        return msg
+
+
+class LogBudget(object):
+    """Per test log volume budget (lines and/or bytes). Once the budget of
+    the current test is exceeded any further messages are written to a
+    compressed overflow file in the test directory rather than to the
+    console and the database.
+    """
+    file_name = "overflow.log.gz"
+
+    def __init__(self, max_lines, max_bytes):
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.start(None)
+
+    def start(self, test_directory):
+        self.test_directory = test_directory
+        self.lines = 0
+        self.bytes = 0
+        self.overflow = None
+        self.overflow_path = None
+        self.diverted_lines = 0
+        self.diverted_bytes = 0
+
+    def exceeded(self, msg):
+        # Count the message against the budget. Return True if the budget
+        # has been exceeded and the message should be diverted.
+        if self.overflow is not None:
+            return True
+        self.lines += 1
+        self.bytes += len(msg.encode("utf8"))
+        return ((self.max_lines is not None and self.lines > self.max_lines)
+                or (self.max_bytes is not None and
+                    self.bytes > self.max_bytes))
+
+    def divert(self, line, redirect):
+        # Write the formatted log line to the overflow file.
+        if self.overflow is None:
+            directory = (self.test_directory or
+                         LogOutputRedirection.root_directory or os.getcwd())
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            self.overflow_path = os.path.join(directory, self.file_name)
+            self.overflow = gzip.open(self.overflow_path, "wb",
+                                      compresslevel=1)
+            redirect.write_to_stdout(
+                "Log budget exceeded, further messages for this test are "
+                "written to {}\n".format(self.overflow_path))
+        data = line.encode("utf8")
+        self.overflow.write(data)
+        self.diverted_lines += 1
+        self.diverted_bytes += len(data)
+
+    def end(self, redirect):
+        # Close the overflow file (if any), link it to the test result and
+        # log a message summarizing the diverted messages.
+        if self.overflow is not None:
+            self.overflow.close()
+            SessionStatus.mongo.update_test_log_overflow(
+                self.overflow_path, self.diverted_lines, self.diverted_bytes)
+            msg = ("Log budget exceeded: {} lines ({} bytes) written to {}"
+                   .format(self.diverted_lines, self.diverted_bytes,
+                           self.overflow_path))
+            self.start(None)
+            redirect.write_summary(msg, get_current_level())
+        else:
+            self.start(None)
+
+
+class FileDescriptorCapture(object):
+    """Capture output written directly to file descriptors 1 and 2 (stdout
+    and stderr), e.g. by C extensions, os.system and child processes that
+    inherit the file descriptors. This output bypasses sys.stdout and
+    sys.stderr so is not seen by LogOutputRedirection.
+    Both file descriptors are redirected to a pipe. A reader thread reads
+    the pipe in large blocks and writes the complete lines to the output
+    redirection (as for print). The console output of the redirection is
+    written to a duplicate of the original stdout.
+    """
+    # Requested pipe buffer size (Linux only). Limited by
+    # /proc/sys/fs/pipe-max-size.
+    pipe_size = 1024 * 1024
+    read_size = 64 * 1024
+
+    def __init__(self, redirect):
+        self.redirect = redirect
+        self.read_fd, self.write_fd = os.pipe()
+        try:
+            import fcntl
+            fcntl.fcntl(self.write_fd, getattr(fcntl, "F_SETPIPE_SZ", 1031),
+                        self.pipe_size)
+        except (ImportError, IOError, OSError):
+            pass
+        for stream in (sys.__stdout__, sys.__stderr__):
+            stream.flush()
+        self.saved_fds = {}
+        for fd in (1, 2):
+            self.saved_fds[fd] = os.dup(fd)
+            os.dup2(self.write_fd, fd)
+        self.console = redirect.printStdout
+        redirect.printStdout = os.fdopen(self.saved_fds[1], "w",
+                                         closefd=False)
+        self.reader = threading.Thread(target=self._read)
+        self.reader.daemon = True
+        self.reader.start()
+
+    def _read(self):
+        partial = b""
+        while True:
+            data = os.read(self.read_fd, self.read_size)
+            if not data:
+                break
+            data = partial + data
+            end = data.rfind(b"\n")
+            if end == -1:
+                partial = data
+                continue
+            partial = data[end + 1:]
+            # One write (and log lock acquisition) for all the complete
+            # lines read.
+            self.redirect.write(data[:end].decode("utf8", "replace"))
+        if partial:
+            self.redirect.write(partial.decode("utf8", "replace"))
+        os.close(self.read_fd)
+
+    def stop(self):
+        """Restore the original file descriptors and wait for the reader
+        thread to write any remaining output.
+        """
+        try:
+            # Flush any C stdio buffers still to be written to the pipe
+            ctypes.CDLL(None).fflush(None)
+        except (OSError, AttributeError, TypeError):
+            pass
+        for fd, saved_fd in self.saved_fds.items():
+            os.dup2(saved_fd, fd)
+        os.close(self.write_fd)
+        # Child processes may still hold the pipe open
+        self.reader.join(timeout=5)
+        self.redirect.printStdout.flush()
+        self.redirect.printStdout = self.console
+        for saved_fd in self.saved_fds.values():
+            os.close(saved_fd)
+
+
+def start_of_test_logs(test_directory):
+    """Reset the per test log budget and start the flight recorder. Any
+    overflow file for the test is created in test_directory.
+    """
+    if LogOutputRedirection.log_budget:
+        LogOutputRedirection.log_budget.start(test_directory)
+    if LogOutputRedirection.flight_recorder:
+        LogOutputRedirection.flight_recorder.start()
+
+
+def end_of_phase_logs(keep, test_complete=False):
+    """Save (keep is True) or discard any log messages held by the flight
+    recorder. Called as each test phase report is processed.
+    At the end of each test (test_complete) the summaries of any collapsed,
+    rate limited or diverted (log budget) messages are written first and
+    the log step durations are saved.
+    """
+    if test_complete and LogOutputRedirection.redirect:
+        LogOutputRedirection.redirect.end_of_test_filters()
+    recorder = LogOutputRedirection.flight_recorder
+    if recorder:
+        if keep:
+            recorder.flush(LogOutputRedirection.redirect)
+        else:
+            recorder.discard()
+        if test_complete:
+            recorder.active = False
+    if test_complete and StepTimer.enabled:
+        durations, slowest = end_of_test_step_timers()
+        SessionStatus.mongo.update_log_durations(durations, slowest)
+
+
+def end_of_session_logs():
+    """Save any log messages still held by the flight recorder (the last
+    test did not complete, e.g. the session was interrupted) and stop
+    holding messages.
+    """
+    recorder = LogOutputRedirection.flight_recorder
+    if recorder:
+        recorder.flush(LogOutputRedirection.redirect)
+        recorder.active = False
+
+
 class LogOutputRedirection(object):
     # Output redirection class. Redirects sys.stdout and stderr to write
     # method below.
@@ -59,10 +423,44 @@ class LogOutputRedirection(object):
     root_directory = None
     session_file_path = None  # created at plugin configuration stage
     test_file_path = None  # file is created in setup phase
+    # The active output redirection and its optional flight recorder,
+    # repeated line filter, line rate limiter and per test log budget.
+    redirect = None
+    flight_recorder = None
+    repeat_filter = None
+    rate_limiter = None
+    log_budget = None
+    fd_capture = None
+    # The step and index of messages logged with a log level
+    # (set_log_parameters) are assigned here, after filtering.
+    assigns_steps = True
 
     def __init__(self):
         self.printStdout = sys.stdout
         self.printStderr = sys.stderr
+        LogOutputRedirection.redirect = self
+        if CONFIG["flight-recorder-level"].value is not None:
+            LogOutputRedirection.flight_recorder = FlightRecorder(
+                CONFIG["flight-recorder-level"].value,
+                CONFIG["flight-recorder-size"].value
+            )
+        if CONFIG["collapse-repeated-lines"].value:
+            LogOutputRedirection.repeat_filter = RepeatedLineFilter()
+        if CONFIG["log-rate-limit"].value:
+            LogOutputRedirection.rate_limiter = LineRateLimiter(
+                CONFIG["log-rate-limit"].value)
+        if (CONFIG["test-log-max-lines"].value is not None or
+                CONFIG["test-log-max-bytes"].value is not None):
+            LogOutputRedirection.log_budget = LogBudget(
+                CONFIG["test-log-max-lines"].value,
+                CONFIG["test-log-max-bytes"].value)
+        # Writer for LogCommon.block (see write_block). Not used if the
+        # messages must pass through the repeated line or rate filters
+        # individually.
+        if self.repeat_filter or self.rate_limiter:
+            self.block_writer = None
+        else:
+            self.block_writer = self.write_block
 
         # Redirect any messages from the python logging module.
         # All (root) loggers.
@@ -82,6 +480,12 @@ class LogOutputRedirection(object):
         root.addHandler(ch)
 
     def write(self, msg):
+        # Output captured at the file descriptor level is written from a
+        # reader thread.
+        with log_lock:
+            self._write(msg)
+
+    def _write(self, msg):
         if isinstance(msg, bytes):
             msg = str(msg, "utf8")
         if not is_level_set():
@@ -93,42 +497,41 @@ class LogOutputRedirection(object):
                     log_level = set_level(1)
                 else:
                     log_level = increment_level(1)
-                step, index = get_step_for_level(log_level)
                 set_tags([], log_level)
                 tags = get_tags()
-                self.write_log_to_console(msg_line, log_level, step, index,
+                # Check for dropped messages before a step and index are
+                # assigned.
+                if not self.is_filtered(msg_line, log_level, tags):
+                    step, index = get_step_for_level(log_level)
+                    self.write_unfiltered(msg_line, log_level, step, index,
                                           tags)
-                SessionStatus.mongo.insert_log_message(index, log_level, step,
-                                                       msg_line, tags)
                 increment_level(-1)
 
         else:
             log_level = get_current_level()
             tags = get_tags()
-            if msg == "":
-                # Printing empty message
-                step, index = get_current_step(log_level)
-                self.write_log_to_console(msg, log_level, step, index, tags)
-                SessionStatus.mongo.insert_log_message(index, log_level, step,
-                                                       msg, tags)
+            if "\n" not in msg:
+                # Single line (or empty) message, no split required
+                self.write_log(msg, log_level, tags)
             else:
                 # split \n and print separately for each line
                 msg_list = msg.split('\n')
                 msg_list = [_f for _f in msg_list if _f]
                 if msg_list:
-                    if len(msg_list) == 1:
-                        step, index = get_current_step(log_level)
-                        self.write_log_to_console(msg_list[0], log_level, step,
-                                                  index, tags)
-                        SessionStatus.mongo.insert_log_message(
-                            index, log_level, step, msg_list[0], tags
-                        )
+                    if len(msg_list) == 1 or self.repeat_filter or \
+                            self.rate_limiter:
+                        # Each line is filtered individually
+                        for msg_line in msg_list:
+                            self.write_log(msg_line, log_level, tags)
                     # MongoDB bulk insert for single prints with string
                     # message split with \n character.
-                    if len(msg_list) > 1:
+                    else:
                         # FIXME add a parameter for this console_suppress_block
                         len_of_msg_block = len(msg_list)
-                        if len(msg_list) > 1000:
+                        recorder = self.flight_recorder
+                        if recorder and not recorder.captures(log_level):
+                            recorder = None
+                        if len(msg_list) > 1000 and not recorder:
                             self.printStdout.write(
                                 "WARNING: Console log has been suppressed "
                                 "because this block is longer than 1000 "
@@ -139,28 +542,31 @@ class LogOutputRedirection(object):
                         else:
                             suppress = False
                         msgs = []
-                        for i, msg_line in enumerate(msg_list):
+                        for msg_line in msg_list:
                             msg_clean = self.clean_message(msg_line)
-                            if i == 0:
-                                step, index = get_current_step(log_level)
-                            else:
-                                step, index = get_step_for_level(log_level)
-                            parent_indices = list(get_parents())
-                            msgs.append(dict(
-                                index=index,
-                                level=log_level,
-                                step=step,
-                                message=msg_clean,
-                                tags=tags,
-                                parent_indices=parent_indices
-                            ))
+                            step, index = get_step_for_level(log_level)
+                            if recorder:
+                                recorder.record(msg_clean, log_level, step,
+                                                index, tags)
+                                continue
+                            if (self.log_budget and
+                                    self.log_budget.exceeded(msg_clean)):
+                                self.log_budget.divert(
+                                    self.format_console_line(
+                                        msg_clean, log_level, step, index,
+                                        tags), self)
+                                continue
+                            msgs.append(LogRecord(index, log_level, step,
+                                                  msg_clean, tags,
+                                                  get_parents()))
 
                             if not suppress:
                                 self.write_log_to_console(
                                     msg_clean, log_level, step, index, tags
                                 )
                         # Bulk insert the block of messages
-                        SessionStatus.mongo.bulk_insert_log_messages(msgs)
+                        if msgs:
+                            SessionStatus.mongo.bulk_insert_log_messages(msgs)
 
     def flush(self):
         # Do nothing. Flush is performed in write -> write_log_step ->
@@ -177,17 +583,124 @@ class LogOutputRedirection(object):
             msg = str(msg, errors='replace')
         return msg
 
+    def is_filtered(self, msg, level, tags):
+        # Return True if the message is a repeat of the previous message or
+        # exceeds the line rate limit and should not be written. Called
+        # before the message is assigned a step and index so any summary of
+        # the messages dropped in the previous rate limit window takes the
+        # step and index before the message.
+        if self.repeat_filter and self.repeat_filter.is_repeat(msg, level,
+                                                                tags):
+            return True
+        if self.rate_limiter:
+            limited, summary = self.rate_limiter.check(msg)
+            if summary:
+                self.write_summary(summary, level)
+            return limited
+        return False
+
+    def write_summary(self, msg, level):
+        # Write a message summarizing collapsed or suppressed messages.
+        if self.repeat_filter:
+            self.repeat_filter.end(self)
+        step, index = get_step_for_level(level)
+        self._write_log(msg, level, step, index, ["LOG-LIMIT"])
+
+    def end_of_test_filters(self):
+        if self.repeat_filter:
+            self.repeat_filter.end(self)
+        if self.rate_limiter:
+            summary = self.rate_limiter.summary()
+            if summary:
+                self.write_summary(summary, get_current_level())
+            self.rate_limiter.__init__(self.rate_limiter.limit)
+        if self.log_budget:
+            self.log_budget.end(self)
+
+    def write_log(self, msg, level, tags):
+        # Assign the step and index and write a single log message unless it
+        # is collapsed (repeated) or rate limited.
+        if not self.is_filtered(msg, level, tags):
+            step, index = get_step_for_level(level)
+            self.write_unfiltered(msg, level, step, index, tags)
+
+    def write_unfiltered(self, msg, level, step, index, tags):
+        if self.repeat_filter:
+            self.repeat_filter.end(self)
+            self.repeat_filter.start(
+                msg, level, tags, self._write_log(msg, level, step, index,
+                                                  tags))
+        else:
+            self._write_log(msg, level, step, index, tags)
+
+    def _write_log(self, msg, level, step, index, tags):
+        # Write a single log message to the console and database, or hold
+        # it in the flight recorder if enabled for this log level.
+        # Returns the inserted database ObjectId or flight recorder entry
+        # (None if diverted to the log budget overflow file).
+        if self.flight_recorder and self.flight_recorder.captures(level):
+            return self.flight_recorder.record(msg, level, step, index, tags)
+        if self.log_budget and self.log_budget.exceeded(msg):
+            self.log_budget.divert(
+                self.format_console_line(msg, level, step, index, tags), self)
+            return None
+        self.write_log_to_console(msg, level, step, index, tags)
+        return SessionStatus.mongo.insert_log_message(index, level, step, msg,
+                                                      tags)
+
+    def write_block(self, records):
+        # Write the LogRecords of a block (LogCommon.block) with a single
+        # console write and database bulk insert. All records are at the
+        # same log level.
+        if not records:
+            return
+        with log_lock:
+            level = records[0].level
+            if self.flight_recorder and self.flight_recorder.captures(level):
+                for record in records:
+                    self.flight_recorder.add(record)
+                return
+            if self.log_budget:
+                within_budget = []
+                for record in records:
+                    if self.log_budget.exceeded(record.message):
+                        self.log_budget.divert(self.format_console_line(
+                            record.message, level, record.step, record.index,
+                            record.tags), self)
+                    else:
+                        within_budget.append(record)
+                records = within_budget
+                if not records:
+                    return
+            if (CONFIG["terminal-max-level"].value is None or
+                    level <= CONFIG["terminal-max-level"].value):
+                self.printStdout.write("".join(
+                    self.format_console_line(record.message, level,
+                                             record.step, record.index,
+                                             record.tags)
+                    for record in records))
+                self.printStdout.flush()
+            SessionStatus.mongo.bulk_insert_log_messages(records)
+
+    def write_to_stdout(self, msg):
+        self.printStdout.write(msg)
+        self.printStdout.flush()
+
     def write_log_to_console(self, msg, level, step, index, tags):
         # Write the log message to the console (original stdout before
         # redirection).
-        if tags:
-            tags_console = " [{}]".format(", ".join(get_tags()))
-        else:
-            tags_console = ""
-
         if (CONFIG["terminal-max-level"].value is None or
                 level <= CONFIG["terminal-max-level"].value):
 
-            self.printStdout.write("{0}-{1} [{2}]{3} {4}\n".format(
-                level, step, index, tags_console, msg))
+            self.printStdout.write(self.format_console_line(msg, level, step,
+                                                            index, tags))
             self.printStdout.flush()
+
+    @staticmethod
+    def format_console_line(msg, level, step, index, tags):
+        if tags:
+            tags_console = " [{}]".format(", ".join(tags))
+        else:
+            tags_console = ""
+        return "{0}-{1} [{2}]{3} {4}\n".format(level, step, index,
+                                               tags_console, msg)
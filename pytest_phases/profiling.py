@@ -0,0 +1,182 @@
+##
+# @file profiling.py
+# @author Sam Lea (samjl) <samjlea@gmail.com>
+# @created 19/10/26
+# @brief pytest phases plugin - fixture cost and test CPU profiling
+from __future__ import absolute_import
+from __future__ import division
+import cProfile
+import io
+import os
+import pstats
+from builtins import object
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from .loglevels import LogLevel
+
+
+class FixtureCosts(object):
+    """Setup and teardown costs of a fixture (name and parameters)
+    aggregated over all of its instances in the session.
+    """
+    __slots__ = ("name", "scope", "setups", "setup_ns", "teardowns",
+                 "teardown_ns", "tests", "parents")
+
+    def __init__(self, name, scope):
+        self.name = name
+        self.scope = scope
+        self.setups = 0
+        self.setup_ns = 0
+        self.teardowns = 0
+        self.teardown_ns = 0
+        self.tests = 0  # Tests run while an instance was active
+        # Parent (module, class or test node ID depending upon the scope) of
+        # each instance
+        self.parents = set()
+
+    def as_dict(self, setup_args):
+        mean_setup = self.setup_ns // self.setups if self.setups else 0
+        mean_teardown = (self.teardown_ns // self.teardowns if self.teardowns
+                         else 0)
+        if self.scope == "function":
+            reinstantiated = 0
+            candidate = (self.setups > 1 and mean_setup + mean_teardown >=
+                         FixtureProfile.expensive_ms * 1000000)
+        else:
+            # Instances in excess of one per parent
+            reinstantiated = self.setups - len(self.parents)
+            candidate = False
+        return dict(
+            fixture=setup_args,
+            fixtureName=self.name,
+            scope=self.scope,
+            setups=self.setups,
+            teardowns=self.teardowns,
+            setupNs=self.setup_ns,
+            teardownNs=self.teardown_ns,
+            totalNs=self.setup_ns + self.teardown_ns,
+            meanSetupNs=mean_setup,
+            meanTeardownNs=mean_teardown,
+            tests=self.tests,
+            testsPerInstance=(round(self.tests / self.setups, 2)
+                              if self.setups else 0),
+            reinstantiated=reinstantiated,
+            widerScopeCandidate=candidate
+        )
+
+
+class FixtureProfile(object):
+    # Costs of each fixture (setup args: name and parameters) in the order
+    # they were first set up.
+    fixtures = OrderedDict()
+    # Function scoped fixtures set up more than once with a mean setup plus
+    # teardown time of at least this are candidates for a wider scope.
+    expensive_ms = 100
+
+
+def profile_fixture_setup(setup_args, name, scope, parent, duration):
+    """Add a fixture instance setup (duration in ns) to the profile."""
+    costs = FixtureProfile.fixtures.get(setup_args)
+    if costs is None:
+        costs = FixtureProfile.fixtures[setup_args] = FixtureCosts(name,
+                                                                   scope)
+    costs.setups += 1
+    costs.setup_ns += duration
+    costs.parents.add(parent)
+
+
+def profile_fixture_teardown(setup_args, duration):
+    """Add a fixture instance teardown (duration in ns) to the profile."""
+    costs = FixtureProfile.fixtures.get(setup_args)
+    if costs is not None:
+        costs.teardowns += 1
+        costs.teardown_ns += duration
+
+
+def profile_test(active_setups):
+    """Count a test against each of the fixture instances it shares."""
+    for setup_args in active_setups:
+        costs = FixtureProfile.fixtures.get(setup_args)
+        if costs is not None:
+            costs.tests += 1
+
+
+def fixture_profile(count):
+    """Return the fixture profile as lists of dicts: the most costly
+    fixtures (total setup and teardown time, up to count), the function
+    scoped fixtures that are candidates for a wider scope and the
+    parametrized fixtures set up more than once per parent (module or
+    class).
+    """
+    profile = [costs.as_dict(setup_args) for setup_args, costs in
+               FixtureProfile.fixtures.items()]
+    profile.sort(key=lambda fixture: fixture["totalNs"], reverse=True)
+    candidates = [fixture for fixture in profile
+                  if fixture["widerScopeCandidate"]]
+    reinstantiated = [fixture for fixture in profile
+                      if fixture["reinstantiated"] > 0]
+    return profile[:count], candidates, reinstantiated
+
+
+class CpuProfiler(object):
+    # cProfile the call phase (and optionally the fixture setups) of the
+    # tests with node IDs matching the patterns.
+    patterns = []
+    fixtures = False
+    top = 20
+    # Node ID and profiler (None if not selected) of the current test
+    node_id = None
+    profiler = None
+    active = False
+
+
+def cpu_profiler(node_id):
+    """Return the profiler of the test with node_id, None if the test is
+    not selected for profiling.
+    """
+    if not CpuProfiler.patterns:
+        return None
+    if node_id != CpuProfiler.node_id:
+        CpuProfiler.node_id = node_id
+        if any(fnmatchcase(node_id, pattern)
+               for pattern in CpuProfiler.patterns):
+            CpuProfiler.profiler = cProfile.Profile()
+        else:
+            CpuProfiler.profiler = None
+    return CpuProfiler.profiler
+
+
+def enable_profiler(profiler):
+    """Enable the test profiler, return False if it is already enabled
+    (e.g. a nested fixture setup).
+    """
+    if CpuProfiler.active:
+        return False
+    profiler.enable()
+    CpuProfiler.active = True
+    return True
+
+
+def disable_profiler(profiler):
+    profiler.disable()
+    CpuProfiler.active = False
+
+
+def save_test_profile(profiler, test_directory):
+    """Save the test profile (pstats file profile.prof) to the test
+    directory, log its top functions (cumulative time) at the debug log
+    level and return the path to the file.
+    """
+    CpuProfiler.profiler = None
+    if not os.path.exists(test_directory):
+        os.makedirs(test_directory)
+    path = os.path.join(test_directory, "profile.prof")
+    profiler.dump_stats(path)
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats(
+        "cumulative").print_stats(CpuProfiler.top)
+    LogLevel.block("Profile saved to {}, top {} functions (cumulative "
+                   "time):".format(path, CpuProfiler.top),
+                   [line for line in stream.getvalue().split("\n")
+                    if line.strip()], log_level=7)
+    return path
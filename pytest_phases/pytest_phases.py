@@ -10,6 +10,7 @@ import os
 import pkg_resources
 import pytest
 import sys
+import time
 import traceback
 from builtins import str
 try:
@@ -39,11 +40,14 @@ from .common import (
     DEBUG,
     MONGO_CONFIG,
     WEB_SERVER_CONFIG,
+    DebugFlags,
     debug_print
 )
 from .loglevels import (
     LogLevel,
-    get_current_index
+    StepTimer,
+    get_current_index,
+    monotonic_ns
 )
 from .mongo import MongoConnector
 from .outcomes import (
@@ -51,17 +55,45 @@ from .outcomes import (
     plural,
     outcome_conditionals,
     phase_specific_result,
-    hierarchy
+    hierarchy,
+    worst_outcome
+)
+from .profiling import (
+    FixtureProfile,
+    CpuProfiler,
+    disable_profiler,
+    enable_profiler,
+    fixture_profile,
+    profile_fixture_setup,
+    profile_fixture_teardown,
+    profile_test,
+    save_test_profile,
+    cpu_profiler
+)
+from .outputredirect import (  # FIXME replace with get
+    FileDescriptorCapture,
+    LogOutputRedirection,
+    end_of_phase_logs,
+    end_of_session_logs,
+    start_of_test_logs
 )
-from .outputredirect import LogOutputRedirection  # FIXME replace with get
 from .verify import (
     VerificationException,
     WarningException,
     FailureTraceback,
+    CallSiteStats,
+    Durations,
+    _split_patterns,
     Result,
+    add_fixture_duration,
+    add_test_duration,
+    call_site_stats,
+    slowest_durations,
     set_saved_raised,
+    start_of_test_source_checks,
     trace_end_detected,
     print_results,
+    serialize_locals,
     SessionStatus
 )
 standard_library.install_aliases()
@@ -77,7 +109,11 @@ def parse_config_file_options(lookup, section, parser):
     for option in list(lookup.keys()):
         try:
             if lookup[option].value_type is int:
-                lookup[option].value = parser.getint(section, option)
+                # An empty value leaves the option unset
+                if parser.get(section, option).strip():
+                    lookup[option].value = parser.getint(section, option)
+                else:
+                    lookup[option].value = None
             elif lookup[option].value_type is bool:
                 lookup[option].value = parser.getboolean(section, option)
             else:
@@ -119,6 +155,7 @@ def pytest_configure(config):
     parse_cmd_line_options(CONFIG, config)
     parse_cmd_line_options(MONGO_CONFIG, config)
     parse_cmd_line_options(WEB_SERVER_CONFIG, config)
+    DebugFlags.resolve()
     print("pytest-phases configuration:")
     # All configuration options (file and command line)
     for option, value in dict(CONFIG, **DEBUG, **MONGO_CONFIG,
@@ -137,6 +174,20 @@ def pytest_configure(config):
         log_redirect = LogOutputRedirection()
         sys.stderr = log_redirect
         sys.stdout = log_redirect
+        StepTimer.enabled = CONFIG["step-durations"].value
+        StepTimer.slowest_count = CONFIG["slowest-steps"].value
+        StepTimer.save_all = CONFIG["log-step-durations"].value
+        if CONFIG["fd-capture"].value:
+            debug_print("Perform file descriptor level output capture",
+                        DEBUG["output-redirect"])
+            LogOutputRedirection.fd_capture = FileDescriptorCapture(
+                log_redirect)
+    CallSiteStats.enabled = bool(CONFIG["verify-call-sites"].value)
+    Durations.count = CONFIG["slowest-durations"].value
+    FixtureProfile.expensive_ms = CONFIG["expensive-fixture-ms"].value
+    CpuProfiler.patterns = _split_patterns(CONFIG["profile-tests"].value)
+    CpuProfiler.fixtures = CONFIG["profile-fixtures"].value
+    CpuProfiler.top = CONFIG["profile-top"].value
     if CONFIG["no-json"].value:
         LogOutputRedirection.json_log = False
         debug_print("JSON logging is disabled (command line)",
@@ -183,6 +234,15 @@ def pytest_configure(config):
                     "file (--config) needs to be specified")
 
 
+def pytest_unconfigure(config):
+    end_of_session_logs()
+    if LogOutputRedirection.fd_capture:
+        debug_print("Restore file descriptors 1 and 2",
+                    DEBUG["output-redirect"])
+        LogOutputRedirection.fd_capture.stop()
+        LogOutputRedirection.fd_capture = None
+
+
 def pytest_collection_modifyitems(session, config, items):
     debug_print(session, DEBUG["mongo"])
     debug_print(config, DEBUG["mongo"])
@@ -203,16 +263,21 @@ def pytest_collection_modifyitems(session, config, items):
 # TODO before this is pytest_runtest_logstart(nodeid, location)
 @pytest.hookimpl(hookwrapper=True)
 def pytest_runtest_setup(item):
-    debug_print("Creating log file for module {}, test function {}".format(
-        item.module.__name__, item.name), DEBUG["output-redirect"])
+    debug_print(lambda: "Creating log file for module {}, test function {}"
+                .format(item.module.__name__, item.name),
+                DEBUG["output-redirect"])
 
+    path_to_test_dir = os.path.join(LogOutputRedirection.root_directory,
+                                    item.module.__name__, item.name)
+    # Reset the per test log budget (overflow file is created in the test
+    # directory if required).
+    start_of_test_logs(path_to_test_dir)
+    start_of_test_source_checks()
     if LogOutputRedirection.json_log:
         # Create module dir if required and test function dir within
         # this and then module_function.json file
-        path_to_test_dir = os.path.join(LogOutputRedirection.root_directory,
-                                        item.module.__name__, item.name)
-        debug_print("Path to test directory: {}".format(path_to_test_dir),
-                    DEBUG["output-redirect"])
+        debug_print(lambda: "Path to test directory: {}".format(
+            path_to_test_dir), DEBUG["output-redirect"])
         if not os.path.exists(path_to_test_dir):
             debug_print("Creating directories", DEBUG["output-redirect"])
             os.makedirs(path_to_test_dir)
@@ -220,13 +285,13 @@ def pytest_runtest_setup(item):
         open(os.path.join(path_to_test_dir, "log.json"), 'w').close()
         LogOutputRedirection.test_file_path = os.path.join(path_to_test_dir,
                                                            "log.json")
-        debug_print("Path to json log file: {}".format(
+        debug_print(lambda: "Path to json log file: {}".format(
             LogOutputRedirection.test_file_path), DEBUG["output-redirect"])
 
-    debug_print("Test SETUP for test {0}".format(item.name),
+    debug_print(lambda: "Test SETUP for test {0}".format(item.name),
                 DEBUG["phases"])
-    debug_print("Test {0.name} SETUP has fixtures: {0.fixturenames}".format(
-        item), DEBUG["scopes"])
+    debug_print(lambda: "Test {0.name} SETUP has fixtures: {0.fixturenames}"
+                .format(item), DEBUG["scopes"])
 
     # Set the initial test phase outcomes
     SessionStatus.test_outcome[item.name] = {
@@ -247,15 +312,14 @@ def pytest_runtest_setup(item):
         are new.
         """
         if isinstance(item.parent, Class):
-            debug_print("Class is {}".format(item.parent.name),
+            debug_print(lambda: "Class is {}".format(item.parent.name),
                         DEBUG["phases"])
             if SessionStatus.class_name != item.parent.name:
                 new_parents["class"] = item.parent.name
             SessionStatus.class_name = item.parent.name
         if isinstance(item.parent, Module):
-            debug_print("Module is {} ({})".format(item.parent.name,
-                                                   SessionStatus.module),
-                        DEBUG["phases"])
+            debug_print(lambda: "Module is {} ({})".format(
+                item.parent.name, SessionStatus.module), DEBUG["phases"])
             if SessionStatus.module != item.parent.name:
                 new_parents["module"] = item.parent.name
             SessionStatus.module = item.parent.name
@@ -270,7 +334,13 @@ def pytest_runtest_setup(item):
             if next_item.parent:
                 get_module_class(next_item, new_parents)
         return new_parents
+    previous_module = SessionStatus.module
     parents = get_module_class(item, {"class": None, "module": None})
+    if (parents["module"] and previous_module is not None and
+            not CONFIG["keep-session-results"].value):
+        # All tests and module scoped teardowns of the previous module are
+        # complete, its results are no longer required.
+        SessionStatus.verifications.evict_module(previous_module)
     debug_print("Test parents (None if same as previous test):",
                 DEBUG["phases"], prettify=parents)
 
@@ -295,9 +365,9 @@ def pytest_runtest_setup(item):
     # Get any setup outcomes already completed and valid for this test:  class
     # or module. scope. phase-results: not applicable for "function" scoped
     # fixtures (run after this stage!).
-    res, summary, outcome = (SessionStatus.verifications.
-                             phase_summary_and_outcome("setup", None,
-                                                       function_scope=False))
+    summary, outcome = (SessionStatus.verifications.
+                        phase_summary_and_outcome("setup", None,
+                                                  function_scope=False))
     # FIXME outcome returns passed if no setups already performed - should
     # be None/in-progress/pending?
 
@@ -309,14 +379,14 @@ def pytest_runtest_setup(item):
     LogLevel.high_level_step("STARTING TEST {}".format(item.name))
 
     outcome = yield
-    debug_print("Test SETUP - Complete {}, outcome: {}".format(item, outcome),
-                DEBUG["phases"])
+    debug_print(lambda: "Test SETUP - Complete {}, outcome: {}".format(
+        item, outcome), DEBUG["phases"])
     # DEBUG This is only here to double check that the fixture has raised
     # the correct exception
     # TODO check if an assertion could come from anywhere other than a fixture
     raised_exc = outcome.excinfo
-    debug_print("Test SETUP - Raised exception: {}".format(raised_exc),
-                DEBUG["phases"])
+    debug_print(lambda: "Test SETUP - Raised exception: {}".format(
+        raised_exc), DEBUG["phases"])
 
     # TODO could this be done at start of pytest_pyfunc_call?
     SessionStatus.phase = "call"
@@ -325,7 +395,7 @@ def pytest_runtest_setup(item):
 # Introduced in pytest 3.0.0
 @pytest.hookimpl(hookwrapper=True)
 def pytest_fixture_setup(fixturedef, request):
-    debug_print("Fixture SETUP for {0.argname} with {0.scope} scope"
+    debug_print(lambda: "Fixture SETUP for {0.argname} with {0.scope} scope"
                 .format(fixturedef), DEBUG["scopes"])
 
     # Setting the phase, test_function, active_setups and test_fixtures is
@@ -344,6 +414,7 @@ def pytest_fixture_setup(fixturedef, request):
         # fixtures. Search for "[" to ensure fixture is parameterized.
         if test_func.startswith("{}[".format(fixture_name)):
             SessionStatus.active_setups.remove(test_func)
+            _remove_from_fixture_stack(test_func)
             # TODO raise a (pytest-)warning
 
     if hasattr(request, "param"):
@@ -352,17 +423,35 @@ def pytest_fixture_setup(fixturedef, request):
         setup_params = ""
     setup_args = "{}{}".format(fixture_name, setup_params)
     SessionStatus.active_setups.append(setup_args)
+    SessionStatus.fixture_stack.append((setup_args, fixture_name,
+                                        fixturedef.scope))
     SessionStatus.test_fixtures[SessionStatus.test_function] = \
         list(SessionStatus.active_setups)
     SessionStatus.exec_func_fix = setup_args
     SessionStatus.mongo.init_fixture(fixture_name, fixturedef.scope)
 
+    profiler = (cpu_profiler(request._pyfuncitem.nodeid)
+                if CpuProfiler.fixtures else None)
+    profiling = profiler is not None and enable_profiler(profiler)
+    start = monotonic_ns()
     res = yield
-    debug_print("Fixture setup (after yield): {}".format(res),
-                DEBUG["scopes"], prettify=res.__dict__)
+    duration = monotonic_ns() - start
+    if profiling:
+        disable_profiler(profiler)
+    debug_print(lambda: "Fixture setup (after yield): {}".format(res),
+                DEBUG["scopes"],
+                prettify=lambda: res.__dict__)
+    add_fixture_duration(setup_args, fixturedef.scope, test_name, "setup",
+                         duration)
+    profile_fixture_setup(setup_args, fixture_name, fixturedef.scope,
+                          _scope_parent(request._pyfuncitem.nodeid,
+                                        fixturedef.scope), duration)
+    # Finalizers run last in, first out so this runs before the fixture's
+    # own teardown (registered during the setup).
+    fixturedef.addfinalizer(lambda: _mark_teardown_start(setup_args))
     if res._excinfo:
         # An exception was raised by the fixture setup
-        debug_print("{}".format(res._excinfo[0].__dict__),
+        debug_print(lambda: "{}".format(res._excinfo[0].__dict__),
                     DEBUG["scopes"])
         if res._excinfo[0] not in (WarningException, VerificationException):
             # Detect a regular assertion (assert) raised by the setup phase.
@@ -375,27 +464,30 @@ def pytest_fixture_setup(fixturedef, request):
             # could check if the traceback object address is already saved
     # TODO unsure how to detect skip etc. here
 
-    debug_print("Fixture SETUP for {0.argname} with {0.scope} scope COMPLETE"
-                .format(fixturedef), DEBUG["scopes"])
+    debug_print(lambda: "Fixture SETUP for {0.argname} with {0.scope} scope "
+                "COMPLETE".format(fixturedef), DEBUG["scopes"])
     results, summary, outcome = (SessionStatus.verifications.
                                  fixture_setup_results(fixture_name,
                                                        test_name))
 
-    SessionStatus.mongo.update_fixture_setup(fixture_name, outcome, summary)
+    SessionStatus.mongo.update_fixture_setup(fixture_name, outcome, summary,
+                                             duration)
     # Raise (first) failed verification saved during setup phase or
     # oid, exc_type, exc_msg, exc_tb
     to_raise = SessionStatus.verifications.raise_exc_type(
-        results, VerificationException)
+        VerificationException, phase="setup", fixture_name=fixture_name,
+        test_function=test_name)
     if to_raise:
-        debug_print("[SETUP] Verification exception to be raised - {}"
+        debug_print(lambda: "[SETUP] Verification exception to be raised - {}"
                     .format(to_raise["exc_msg"]), DEBUG["phases"])
         raise_(to_raise["exc_type"], to_raise["exc_msg"], to_raise["exc_tb"])
     if CONFIG["raise-warnings"].value:
         # else raise (first) warned verification saved during setup phase
         to_raise = SessionStatus.verifications.raise_exc_type(
-            results, WarningException)
+            WarningException, phase="setup", fixture_name=fixture_name,
+            test_function=test_name)
         if to_raise:
-            debug_print("[SETUP] Warning exception to be raised - {}"
+            debug_print(lambda: "[SETUP] Warning exception to be raised - {}"
                         .format(to_raise["exc_msg"]), DEBUG["phases"])
             raise_(to_raise["exc_type"], to_raise["exc_msg"],
                    to_raise["exc_tb"])
@@ -405,13 +497,13 @@ def pytest_fixture_setup(fixturedef, request):
 @pytest.hookimpl(hookwrapper=True)
 def pytest_fixture_post_finalizer(fixturedef, request):
     # FIXME check that the current set phase is teardown
-    debug_print("Fixture TEARDOWN for {0.argname} with {0.scope} scope"
-                .format(fixturedef), DEBUG["scopes"])
+    debug_print(lambda: "Fixture TEARDOWN for {0.argname} with {0.scope} "
+                "scope".format(fixturedef), DEBUG["scopes"])
 
     # fixturedef.cached_result is always (None, 0, none) so use
     # sys.exc_info instead
     exc_info = sys.exc_info()
-    debug_print("Fixture teardown exc_info: {}".format(exc_info),
+    debug_print(lambda: "Fixture teardown exc_info: {}".format(exc_info),
                 DEBUG["scopes"])
     if exc_info:
         # An exception was raised by the fixture teardown
@@ -429,8 +521,8 @@ def pytest_fixture_post_finalizer(fixturedef, request):
             # could check if the traceback object address is already saved
     # TODO unsure how to detect skip etc. here
 
-    debug_print("Fixture TEARDOWN for {0.argname} with {0.scope} scope "
-                "COMPLETE".format(fixturedef), DEBUG["scopes"])
+    debug_print(lambda: "Fixture TEARDOWN for {0.argname} with {0.scope} "
+                "scope COMPLETE".format(fixturedef), DEBUG["scopes"])
     fixture_name = fixturedef.argname
     test_name = request._pyfuncitem.name
     scope = fixturedef.scope
@@ -442,26 +534,38 @@ def pytest_fixture_post_finalizer(fixturedef, request):
     else:
         setup_params = ""
     setup_args = "{}{}".format(fixturedef.argname, setup_params)
+    start = Durations.teardown_start.pop(setup_args, None)
+    if start is None:
+        duration = None
+    else:
+        duration = monotonic_ns() - start
+        add_fixture_duration(setup_args, scope, test_name, "teardown",
+                             duration)
+        profile_fixture_teardown(setup_args, duration)
     # keep track of previous (this) teardown fixture
     SessionStatus.prev_teardown = setup_args
+    _remove_from_fixture_stack(setup_args)
     try:
         SessionStatus.active_setups.remove(setup_args)
     except ValueError as e:
-        debug_print("Could not remove fixture from active setups (probably "
-                    "removed already) - {}".format(e), DEBUG["scopes"])
+        debug_print(lambda: "Could not remove fixture from active setups "
+                    "(probably removed already) - {}".format(e),
+                    DEBUG["scopes"])
     except Exception as e:
         print(str(e))
     else:
         SessionStatus.mongo.update_fixture_teardown(fixturedef.argname,
-                                                    outcome, summary, scope)
+                                                    outcome, summary, scope,
+                                                    duration)
 
     res = yield
     # DEBUG seem to get multiple module based executions of this code ???
-    debug_print("Fixture post finalizer (after yield): {}".format(res),
-                DEBUG["scopes"], prettify=res.__dict__)
+    debug_print(lambda: "Fixture post finalizer (after yield): {}".format(
+        res), DEBUG["scopes"], prettify=lambda: res.__dict__)
 
     to_raise = SessionStatus.verifications.raise_exc_type(
-        results, VerificationException)
+        VerificationException, phase="teardown", fixture_name=fixture_name,
+        test_function=test_name)
     if to_raise:
         print("[POST TEARDOWN] Verification exception to be raised - {}"
               .format(to_raise["exc_msg"]))
@@ -469,7 +573,8 @@ def pytest_fixture_post_finalizer(fixturedef, request):
     if CONFIG["raise-warnings"].value:
         # else raise (first) warned verification saved during setup phase
         to_raise = SessionStatus.verifications.raise_exc_type(
-            results, WarningException)
+            WarningException, phase="teardown", fixture_name=fixture_name,
+            test_function=test_name)
         if to_raise:
             print("[POST TEARDOWN] Warning exception to be raised - {}"
                   .format(to_raise["exc_msg"]))
@@ -477,9 +582,41 @@ def pytest_fixture_post_finalizer(fixturedef, request):
                    to_raise["exc_tb"])
 
 
+def _scope_parent(node_id, scope):
+    # The parent node ID of a fixture instance with the given scope (set up
+    # for the test with node_id).
+    if scope == "session":
+        return ""
+    parts = node_id.split("::")
+    if scope == "package":
+        # Directory of the module
+        return parts[0].rpartition("/")[0]
+    if scope == "module":
+        return parts[0]
+    if scope == "class":
+        return "::".join(parts[:-1])
+    return node_id
+
+
+def _mark_teardown_start(setup_args):
+    # Fixture finalizer, record the start time of the fixture teardown.
+    Durations.teardown_start[setup_args] = monotonic_ns()
+
+
+def _remove_from_fixture_stack(setup_args):
+    # Remove the (most recent) entry for a fixture from the active fixture
+    # stack.
+    stack = SessionStatus.fixture_stack
+    for i in range(len(stack) - 1, -1, -1):
+        if stack[i][0] == setup_args:
+            del stack[i]
+            break
+
+
 @pytest.hookimpl(hookwrapper=True)
 def pytest_pyfunc_call(pyfuncitem):
-    debug_print("CALL - Starting {}".format(pyfuncitem.name), DEBUG["phases"])
+    debug_print(lambda: "CALL - Starting {}".format(pyfuncitem.name),
+                DEBUG["phases"])
     SessionStatus.exec_func_fix = pyfuncitem.name
     SessionStatus.test_function = pyfuncitem.name
     # Update mongo test result
@@ -495,12 +632,21 @@ def pytest_pyfunc_call(pyfuncitem):
     # SessionStatus.mongo.update_test_result(query, update)
     SessionStatus.mongo.update_pre_call_phase()
 
+    profiler = cpu_profiler(pyfuncitem.nodeid)
+    profiling = profiler is not None and enable_profiler(profiler)
     outcome = yield
-    debug_print("CALL - Completed {}, outcome {}".format(pyfuncitem, outcome),
-                DEBUG["phases"])
+    if profiling:
+        disable_profiler(profiler)
+    if profiler is not None:
+        path = save_test_profile(profiler, os.path.join(
+            LogOutputRedirection.root_directory,
+            pyfuncitem.module.__name__, pyfuncitem.name))
+        SessionStatus.mongo.update_test_profile(path)
+    debug_print(lambda: "CALL - Completed {}, outcome {}".format(
+        pyfuncitem, outcome), DEBUG["phases"])
     # outcome.excinfo may be None or a (cls, val, tb) tuple
     raised_exc = outcome.excinfo
-    debug_print("CALL - Caught exception: {}".format(raised_exc),
+    debug_print(lambda: "CALL - Caught exception: {}".format(raised_exc),
                 DEBUG["phases"])
     if raised_exc:
         if raised_exc[0] not in (WarningException, VerificationException):
@@ -513,19 +659,18 @@ def pytest_pyfunc_call(pyfuncitem):
 
     # Re-raise first VerificationException not yet raised
     # Saved and immediately raised VerificationExceptions are raised here.
-    results = SessionStatus.verifications.saved_results
     to_raise = SessionStatus.verifications.raise_exc_type(
-        results, VerificationException)
+        VerificationException)
     if to_raise:
-        debug_print("[CALL] Verification exception to be raised - {}"
+        debug_print(lambda: "[CALL] Verification exception to be raised - {}"
                     .format(to_raise["exc_msg"]), DEBUG["phases"])
         raise_(to_raise["exc_type"], to_raise["exc_msg"], to_raise["exc_tb"])
     if CONFIG["raise-warnings"].value:
         # else raise (first) warned verification saved during setup phase
         to_raise = SessionStatus.verifications.raise_exc_type(
-            results, WarningException)
+            WarningException)
         if to_raise:
-            debug_print("[CALL] Warning exception to be raised - {}"
+            debug_print(lambda: "[CALL] Warning exception to be raised - {}"
                         .format(to_raise["exc_msg"]), DEBUG["phases"])
             raise_(to_raise["exc_type"], to_raise["exc_msg"],
                    to_raise["exc_tb"])
@@ -533,7 +678,8 @@ def pytest_pyfunc_call(pyfuncitem):
 
 @pytest.hookimpl(hookwrapper=True)
 def pytest_runtest_teardown(item, nextitem):
-    debug_print("Test TEARDOWN - Starting {}".format(item), DEBUG["phases"])
+    debug_print(lambda: "Test TEARDOWN - Starting {}".format(item),
+                DEBUG["phases"])
     SessionStatus.phase = "teardown"
 
     # i = get_current_index()
@@ -541,10 +687,10 @@ def pytest_runtest_teardown(item, nextitem):
     SessionStatus.mongo.update_teardown_phase()
 
     outcome = yield
-    debug_print("Test TEARDOWN - completed {}, outcome: {}".format(item,
-                outcome), DEBUG["phases"])
-    debug_print("Test TEARDOWN - Raised exception: {}".format(outcome.excinfo),
-                DEBUG["phases"])
+    debug_print(lambda: "Test TEARDOWN - completed {}, outcome: {}".format(
+        item, outcome), DEBUG["phases"])
+    debug_print(lambda: "Test TEARDOWN - Raised exception: {}".format(
+        outcome.excinfo), DEBUG["phases"])
 
 
 def _save_non_verify_exc(raised_exc, use_prev_teardown=False):
@@ -575,7 +721,7 @@ def _save_non_verify_exc(raised_exc, use_prev_teardown=False):
         failure_type = "FAIL"
         exc_type = "O"
 
-    debug_print("Saving caught exception (non-plugin): {}, {}".format(
+    debug_print(lambda: "Saving caught exception (non-plugin): {}, {}".format(
         exc_type, exc_msg), DEBUG["verify"])
 
     frame = raised_exc[2]
@@ -593,8 +739,8 @@ def _save_non_verify_exc(raised_exc, use_prev_teardown=False):
         # TODO enhancement: remove keys starting with "@py_"
         locals_all_frames.append(frame.tb_frame.f_locals)
         frame = frame.tb_next
-    debug_print("all frames locals: {}".format(locals_all_frames),
-                 DEBUG["verify"])
+    debug_print(lambda: "all frames locals: {}".format(locals_all_frames),
+                DEBUG["verify"])
 
     trace_complete = []
     for i, tb_level in enumerate(reversed(stack_trace)):
@@ -610,35 +756,38 @@ def _save_non_verify_exc(raised_exc, use_prev_teardown=False):
             break
         level_detail['code'].append(">   {0[3]}".format(tb_level))
         if CONFIG["include-all-local-vars"].value:
-            level_detail['locals'] = locals_all_frames[-(i+1)]
+            level_detail['locals'] = serialize_locals(
+                locals_all_frames[-(i+1)])
         level_detail['location'] = "{0[0]}:{0[1]}:{0[2]}".format(tb_level)
         trace_complete.insert(0, level_detail)
 
     # Divide by 3 as each failure has 3 lines (list entries)
-    debug_print("# of tracebacks: {}".format(old_div(len(trace_complete), 3)),
+    debug_print(lambda: "# of tracebacks: {}".format(
+        old_div(len(trace_complete), 3)), DEBUG["verify"])
+    debug_print(lambda: "length of locals: {}".format(len(locals_all_frames)),
                 DEBUG["verify"])
-    debug_print("length of locals: {}".format(len(locals_all_frames)),
-                DEBUG["verify"])
-    if DEBUG["verify"]:
-        for line in trace_complete:
-            debug_print(line, DEBUG["verify"])
+    debug_print("Traceback levels:", DEBUG["verify"], prettify=trace_complete)
 
     fixture_name = None
     fixture_scope = None
-    for i, stack_locals in enumerate(reversed(locals_all_frames)):
-        # Most recent stack entry first
-        # Extract the setup/teardown fixture information if possible
-        # keep track of the fixture name and scope
-        for item in list(stack_locals.values()):
-            if isinstance(item, FixtureDef):
-                fixture_name = item.argname
-                fixture_scope = item.scope
-                debug_print("scope for {} is {} [{}]".format(fixture_name,
-                            fixture_scope, i), DEBUG["verify"])
-        if fixture_scope:
-            break
-
-    debug_print("saving: {}, {}".format(fixture_name, fixture_scope),
+    if SessionStatus.phase != "call" and SessionStatus.fixture_stack:
+        # Fixture currently being setup or torn down
+        fixture_name, fixture_scope = SessionStatus.fixture_stack[-1][1:]
+    else:
+        for i, stack_locals in enumerate(reversed(locals_all_frames)):
+            # Most recent stack entry first
+            # Extract the setup/teardown fixture information if possible
+            # keep track of the fixture name and scope
+            for item in list(stack_locals.values()):
+                if isinstance(item, FixtureDef):
+                    fixture_name = item.argname
+                    fixture_scope = item.scope
+                    debug_print(lambda: "scope for {} is {} [{}]".format(
+                        fixture_name, fixture_scope, i), DEBUG["verify"])
+            if fixture_scope:
+                break
+
+    debug_print(lambda: "saving: {}, {}".format(fixture_name, fixture_scope),
                 DEBUG["verify"])
 
     # Log failed and caught assertion (saved separately to db as
@@ -646,26 +795,26 @@ def _save_non_verify_exc(raised_exc, use_prev_teardown=False):
     LogLevel.verification("{} - FAIL".format(exc_msg), exc_type, tags="FAIL")
     index = get_current_index()
     # Save the result and traceback
-    s_res = SessionStatus.verifications.saved_results
-    s_tb = SessionStatus.verifications.saved_tracebacks
-    s_tb.append(FailureTraceback(raised_exc[0], raised_exc[2], trace_complete,
-                                 raised=True))
+    # Already raised so only the formatted traceback is kept (not the frames)
+    failure_traceback = FailureTraceback(raised_exc[0], None, trace_complete,
+                                         raised=True)
+    SessionStatus.verifications.save_traceback(failure_traceback)
     module_function_line = trace_complete[-1]["location"]
     result = Result(exc_msg, failure_type, exc_type, fixture_scope,
                     module_function_line, trace_complete[-1]["code"],
                     True, message_index=index,
                     source_locals=trace_complete[-1]["locals"],
-                    fail_traceback_link=s_tb[-1],
+                    fail_traceback_link=failure_traceback,
                     use_prev_teardown=use_prev_teardown)
-    s_res.append(result)
-    s_tb[-1].result_link = s_res[-1]
+    SessionStatus.verifications.save_result(result)
+    failure_traceback.result_link = result
     SessionStatus.mongo.insert_verification(result)
 
 
 @pytest.hookimpl(hookwrapper=True)
 def pytest_report_teststatus(report):
-    debug_print("TEST REPORT FOR {} PHASE: {}".format(report.when,
-                report.outcome), DEBUG["phases"])
+    debug_print(lambda: "TEST REPORT FOR {} PHASE: {}".format(
+        report.when, report.outcome), DEBUG["phases"])
     # Update the test name for tests that don't have fixtures associated
     # with them (no function scoped fixtures and no higher scoped fixtures
     # associated with it by pytest (e.g. not first test in module or class).
@@ -677,18 +826,25 @@ def pytest_report_teststatus(report):
     result_category = result._result[0]
     # TODO Check that empty '' result_category refers to undefined test
     # reports - passed setup or teardown only
-    debug_print("result category: {}".format(result_category),
+    debug_print(lambda: "result category: {}".format(result_category),
                 DEBUG["phases"])
     # Get the saved results, saved result summary and the phase outcome
-    teardown_results, summary, outcome = (
+    summary, outcome = (
         SessionStatus.verifications.phase_summary_and_outcome(report.when,
                                                               result_category,
                                                               True)
     )
     SessionStatus.test_outcome[test_name][report.when] = outcome
+    duration = int(report.duration * 1e9)
+    add_test_duration(report.nodeid, report.when, duration)
     SessionStatus.mongo.update_test_phase_complete(report.when, outcome,
-                                                   summary)
-    # TODO process the duration per phase - report.duration
+                                                   summary, duration)
+    if report.when == "setup":
+        profile_test(SessionStatus.active_setups)
+    if report.when != "teardown" and outcome != Outcomes.passed:
+        # Save any messages held by the flight recorder now, the test has
+        # not passed.
+        end_of_phase_logs(True)
     # Possible TODO print saved results for each phase - limited use because
     # teardown results cannot be complete for all tests
 
@@ -696,25 +852,28 @@ def pytest_report_teststatus(report):
         # For end of each test
         LogOutputRedirection.test_file_path = None
         # Update the overall test result
-        index = len(hierarchy) - 1
-        debug_print("Initial outcome is {}".format(hierarchy[index]),
-                    DEBUG['phases'])
-        for phase_outcome in (SessionStatus.test_outcome[test_name]["setup"],
-                              SessionStatus.test_outcome[test_name]["call"],
-                              SessionStatus.test_outcome[test_name]["teardown"]):
-            phase_outcome_index = hierarchy.index(phase_outcome)
-            if phase_outcome_index < index:
-                index = phase_outcome_index
+        test_outcome = SessionStatus.test_outcome[test_name]
+        preliminary_outcome = worst_outcome(test_outcome["setup"],
+                                            test_outcome["call"],
+                                            test_outcome["teardown"])
+        # Save the flight recorder messages for tests that have not passed,
+        # discard them otherwise.
+        end_of_phase_logs(preliminary_outcome != Outcomes.passed,
+                          test_complete=True)
         # TODO not preliminary if result is failed
-        debug_print("Preliminary test outcome is {}".format(hierarchy[index]),
-                    DEBUG['phases'])
+        debug_print(lambda: "Preliminary test outcome is {}".format(
+            preliminary_outcome), DEBUG['phases'])
         # TODO Print phase results at higher level
-        LogLevel.high_level_step("Preliminary test outcome is {}".format(hierarchy[index]))
+        LogLevel.high_level_step("Preliminary test outcome is {}".format(
+            preliminary_outcome))
         LogLevel.detail_step("Note: doesn't include the result of any higher "
                              "scoped teardown functions.")
 
         # Reset the test name as it is now complete
         SessionStatus.test_function = None
+        # The frames of any tracebacks saved (and not raised) during the
+        # test are no longer required.
+        SessionStatus.verifications.release_frames()
 
         if not SessionStatus.active_setups:
             # At end of a test module. This assumes that we are not using
@@ -731,68 +890,57 @@ def pytest_report_teststatus(report):
 
 def final_test_outcomes():
     summary_results = {}
+    verifications = SessionStatus.verifications
     for module_class_function in SessionStatus.run_order:
         module_name, class_name, test_func = module_class_function
-        results = SessionStatus.verifications.filter_results(
-            phase="teardown", scope="class", class_name=class_name)
-        results.extend(SessionStatus.verifications.filter_results(
-            phase="teardown", scope="module", module_name=module_name))
-        results.extend(SessionStatus.verifications.filter_results(
-            phase="teardown", scope="function", test_function=test_func))
         # not req to update the outcome
-        summary = SessionStatus.verifications._results_summary(results)
+        summary = verifications._merge_summaries(
+            verifications.results_summary(phase="teardown", scope="class",
+                                          class_name=class_name),
+            verifications.results_summary(phase="teardown", scope="module",
+                                          module_name=module_name),
+            verifications.results_summary(phase="teardown", scope="function",
+                                          test_function=test_func))
 
         def phase_outcome(saved_summary, pytest_outcome):
             for outcome_condition, outcome in outcome_conditionals:
                 if outcome_condition(saved_summary, pytest_outcome):
                     return phase_specific_result("teardown", outcome)
 
-        tear_outcome = phase_outcome(summary, None)
-        index = len(hierarchy) - 1
-        for phase_outcome in (SessionStatus.test_outcome[test_func]["teardown"],
-                              tear_outcome):
-            phase_outcome_index = hierarchy.index(phase_outcome)
-            if phase_outcome_index < index:
-                index = phase_outcome_index
-        tear_outcome = hierarchy[index]
-
-        setup_results = SessionStatus.verifications.filter_results(
-            phase="setup", scope="class", class_name=class_name)
-        setup_results.extend(SessionStatus.verifications.filter_results(
-            phase="setup", scope="module", module_name=module_name))
-        setup_results.extend(SessionStatus.verifications.filter_results(
-            phase="setup", scope="function", test_function=test_func))
-        # not req to update the outcome
-        setup_summary = SessionStatus.verifications._results_summary(setup_results)
+        test_outcome = SessionStatus.test_outcome[test_func]
+        tear_outcome = worst_outcome(test_outcome["teardown"],
+                                     phase_outcome(summary, None))
 
-        call_results = (SessionStatus.verifications.filter_results(
-            phase="call", test_function=test_func))
-        call_summary = SessionStatus.verifications._results_summary(call_results)
+        setup_summary = verifications._merge_summaries(
+            verifications.results_summary(phase="setup", scope="class",
+                                          class_name=class_name),
+            verifications.results_summary(phase="setup", scope="module",
+                                          module_name=module_name),
+            verifications.results_summary(phase="setup", scope="function",
+                                          test_function=test_func))
+        call_summary = verifications.results_summary(phase="call",
+                                                     test_function=test_func)
 
         # Get the final test outcome
-        index = len(hierarchy) - 1
-        for phase_outcome in (SessionStatus.test_outcome[test_func]["setup"],
-                              SessionStatus.test_outcome[test_func]["call"],
-                              # SessionStatus.test_outcome[test_func]["teardown"],
-                              tear_outcome):
-            phase_outcome_index = hierarchy.index(phase_outcome)
-            if phase_outcome_index < index:
-                index = phase_outcome_index
+        final_outcome = worst_outcome(test_outcome["setup"],
+                                      test_outcome["call"],
+                                      # test_outcome["teardown"],
+                                      tear_outcome)
         LogLevel.high_level_step("{} FINAL TEST OUTCOME: {}".format(
-            test_func, hierarchy[index]))
+            test_func, final_outcome))
         LogLevel.detail_step("Test setup outcome: {}, summary: {}".format(
-            SessionStatus.test_outcome[test_func]["setup"], setup_summary))
+            test_outcome["setup"], setup_summary))
         LogLevel.detail_step("Test call outcome: {}, summary: {}".format(
-            SessionStatus.test_outcome[test_func]["call"], call_summary))
+            test_outcome["call"], call_summary))
         # This is the final updated test teardown
         LogLevel.detail_step("Test teardown outcome: {}, summary: {}"
                              .format(tear_outcome, summary))
 
         # Increment the test result outcome counter
-        if hierarchy[index] not in summary_results:
-            summary_results[hierarchy[index]] = 1
+        if final_outcome not in summary_results:
+            summary_results[final_outcome] = 1
         else:
-            summary_results[hierarchy[index]] += 1
+            summary_results[final_outcome] += 1
     return summary_results
 
 
@@ -818,9 +966,75 @@ def final_summary(summary_results):
 @pytest.hookimpl(hookwrapper=True)
 def pytest_runtestloop(session):
     yield
+    if CallSiteStats.enabled:
+        call_site_summary(CONFIG["verify-call-sites"].value)
+    if CONFIG["slowest-durations"].value:
+        durations_summary(CONFIG["slowest-durations"].value)
     SessionStatus.mongo.update_session_complete()
 
 
+def call_site_summary(count):
+    most_executed, most_time = call_site_stats(count)
+    if not most_executed:
+        return
+
+    def call_site_line(site):
+        return ("{calls} ({passes} passed, {warnings} warned, {failures} "
+                "failed), {ms:.3f} ms ({us:.1f} us per call): {location}"
+                .format(ms=site["timeNs"] / 1e6,
+                        us=site["timeNs"] / 1e3 / site["calls"], **site))
+
+    LogLevel.high_level_step("VERIFY CALL SITES")
+    LogLevel.block("Most executed:",
+                   [call_site_line(site) for site in most_executed],
+                   log_level=2)
+    LogLevel.block("Most time spent verifying:",
+                   [call_site_line(site) for site in most_time],
+                   log_level=2)
+    SessionStatus.mongo.update_session_call_sites(most_executed, most_time)
+
+
+def durations_summary(count):
+    tests, fixtures = slowest_durations(count)
+    if not tests and not fixtures:
+        return
+
+    def test_line(test):
+        phases = ", ".join("{} {:.3f} s".format(phase, test["{}Ns".format(
+            phase)] / 1e9) for phase in ("setup", "call", "teardown")
+            if "{}Ns".format(phase) in test)
+        return "{:.3f} s ({}): {}".format(test["durationNs"] / 1e9, phases,
+                                          test["nodeId"])
+
+    def fixture_line(fixture):
+        return ("{:.3f} s: {fixtureName} ({scope} scope) {phase}, test "
+                "{testName}".format(fixture["durationNs"] / 1e9, **fixture))
+
+    LogLevel.high_level_step("SLOWEST TESTS AND FIXTURES")
+    LogLevel.block("Slowest tests:", [test_line(test) for test in tests],
+                   log_level=2)
+    LogLevel.block("Slowest fixture setups and teardowns:",
+                   [fixture_line(fixture) for fixture in fixtures],
+                   log_level=2)
+    SessionStatus.mongo.update_session_durations(tests, fixtures)
+
+
+def _results_by_fixture(saved_results):
+    # Collect all the results for each reported phase/scope(/fixture)
+    result_by_fixture = OrderedDict()
+    for saved_result in saved_results:
+        key = "{0.fixture_name}:{0.test_function}:{0.phase}:{0.scope}"\
+            .format(saved_result)
+        if key not in result_by_fixture:
+            result_by_fixture[key] = {}
+            result_by_fixture[key][saved_result.type_code] = 1
+        elif saved_result.type_code not in result_by_fixture[key]:
+            result_by_fixture[key][saved_result.type_code] = 1
+        else:
+            result_by_fixture[key][saved_result.type_code] += 1
+    return result_by_fixture
+
+
 @pytest.hookimpl(hookwrapper=True)
 def pytest_terminal_summary(terminalreporter):
     """ override the terminal summary reporting. """
@@ -839,42 +1053,27 @@ def pytest_terminal_summary(terminalreporter):
                     DEBUG["summary"])
         exit_code = 0
 
-    if DEBUG["verify"]:
-        debug_print("Saved Results (dictionaries)", DEBUG["verify"])
-        for i, res in enumerate(SessionStatus.verifications.saved_results):
-            debug_print("{} - {}".format(i, res.__dict__), DEBUG["verify"])
-        debug_print("Saved Tracebacks (dictionaries)", DEBUG["verify"])
-        for i, tb in enumerate(SessionStatus.verifications.saved_tracebacks):
-            debug_print("{} - {}".format(i, tb.__dict__), DEBUG["verify"])
-        for saved_tb in SessionStatus.verifications.saved_tracebacks:
-            debug_print("Result {0.result_link} linked to traceback {0}"
-                        .format(saved_tb), DEBUG["verify"])
-    if DEBUG["summary"]:
-        debug_print("Run order:", DEBUG["summary"])
-        for module_class_function in SessionStatus.run_order:
-            debug_print("{0[0]}::{0[1]}::{0[2]}".format(module_class_function),
-                        DEBUG["summary"])
-        debug_print("Test function fixture dependencies:", DEBUG["summary"])
-        for test_name, setup_fixtures in SessionStatus.test_fixtures.items():
-            debug_print("{} depends on setup fixtures: {}"
-                        .format(test_name, ", ".join(setup_fixtures)),
-                        DEBUG["summary"])
-        # Collect all the results for each reported phase/scope(/fixture)
-        result_by_fixture = OrderedDict()
-        debug_print("Scope/phase saved results summary in executions order:",
-                    DEBUG["summary"])
-        for saved_result in SessionStatus.verifications.saved_results:
-            key = "{0.fixture_name}:{0.test_function}:{0.phase}:{0.scope}"\
-                .format(saved_result)
-            if key not in result_by_fixture:
-                result_by_fixture[key] = {}
-                result_by_fixture[key][saved_result.type_code] = 1
-            elif saved_result.type_code not in result_by_fixture[key]:
-                result_by_fixture[key][saved_result.type_code] = 1
-            else:
-                result_by_fixture[key][saved_result.type_code] += 1
-        for key, val in result_by_fixture.items():
-            debug_print("{}: {}".format(key, val), DEBUG["summary"])
+    saved_results = SessionStatus.verifications.saved_results
+    saved_tracebacks = SessionStatus.verifications.saved_tracebacks
+    debug_print("Saved Results (dictionaries)", DEBUG["verify"],
+                prettify=lambda: [res.as_dict() for res in saved_results])
+    debug_print("Saved Tracebacks (dictionaries)", DEBUG["verify"],
+                prettify=lambda: [tb.as_dict() for tb in saved_tracebacks])
+    debug_print("Result links to tracebacks", DEBUG["verify"],
+                prettify=lambda: ["Result {0.result_link} linked to traceback "
+                                  "{0}".format(tb) for tb in saved_tracebacks])
+    debug_print("Run order:", DEBUG["summary"],
+                prettify=lambda: ["{0[0]}::{0[1]}::{0[2]}".format(run)
+                                  for run in SessionStatus.run_order])
+    debug_print("Test function fixture dependencies:", DEBUG["summary"],
+                prettify=lambda: [
+                    "{} depends on setup fixtures: {}".format(
+                        test_name, ", ".join(setup_fixtures))
+                    for test_name, setup_fixtures in
+                    SessionStatus.test_fixtures.items()])
+    debug_print("Scope/phase saved results summary in executions order:",
+                DEBUG["summary"],
+                prettify=lambda: _results_by_fixture(saved_results))
     # DEBUG END
 
     # Parse the pytest reports
@@ -891,7 +1090,7 @@ def pytest_terminal_summary(terminalreporter):
     pytest_xpassed_reports = list()
     for report_type, reports in pytest_reports.items():
         for report in reports:
-            debug_print("Report type: {}, report: {}".format(
+            debug_print(lambda: "Report type: {}, report: {}".format(
                 report_type, report), DEBUG["summary"])
             if isinstance(report, CollectReport):
                 debug_print("Found CollectReport", DEBUG["summary"])
@@ -938,6 +1137,9 @@ def pytest_terminal_summary(terminalreporter):
                                  "pytest-warnings")
     # TODO update Mongo session and print to the session dashboard
 
+    if CONFIG["fixture-profile"].value:
+        fixture_profile_summary(CONFIG["fixture-profile"].value)
+
     # session_duration = time.time() - terminalreporter._sessionstarttime
 
     # # DEBUG ONLY
@@ -964,6 +1166,40 @@ def pytest_terminal_summary(terminalreporter):
     # print("Anything following this message is the original pytest code")
 
 
+def fixture_profile_summary(count):
+    most_costly, candidates, reinstantiated = fixture_profile(count)
+    if not most_costly:
+        return
+
+    def fixture_line(fixture):
+        return ("{total:.3f} s: {fixture} ({scope} scope) {setups} setups "
+                "(mean {setup:.3f} s), {teardowns} teardowns (mean "
+                "{teardown:.3f} s), {tests} tests ({testsPerInstance} per "
+                "instance)".format(total=fixture["totalNs"] / 1e9,
+                                   setup=fixture["meanSetupNs"] / 1e9,
+                                   teardown=fixture["meanTeardownNs"] / 1e9,
+                                   **fixture))
+
+    LogLevel.high_level_step("FIXTURE PROFILE")
+    LogLevel.block("Most costly fixtures (setup and teardown time):",
+                   [fixture_line(fixture) for fixture in most_costly],
+                   log_level=2)
+    if candidates:
+        LogLevel.block("Expensive function scoped fixtures (candidates for a "
+                       "wider scope):",
+                       [fixture_line(fixture) for fixture in candidates],
+                       log_level=2)
+    if reinstantiated:
+        LogLevel.block("Fixtures set up more than once per module or class "
+                       "scope:",
+                       ["{} re-instantiated {} times: {}".format(
+                           fixture["fixture"], fixture["reinstantiated"],
+                           fixture_line(fixture))
+                        for fixture in reinstantiated], log_level=2)
+    SessionStatus.mongo.update_session_fixture_profile(
+        most_costly, candidates, reinstantiated)
+
+
 def _print_summary(terminalreporter, report):
     # print "********** {} **********".format(report)
     # writes directly - does not return anything
@@ -8,24 +8,44 @@
 from __future__ import print_function
 from __future__ import absolute_import
 from __future__ import division
+import heapq
 import inspect
+import linecache
+import os
 import re
 import sys
 from _pytest.fixtures import FixtureDef  # requires pytest version>=3.0.0
 from builtins import object, range, str
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from itertools import chain, islice
+from fnmatch import fnmatchcase
 from future.utils import raise_
 from past.utils import old_div
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    # Python 3
+    from reprlib import Repr
+except ImportError:
+    # Python 2
+    from repr import Repr
 from .common import (
     CONFIG,
-    DEBUG
+    DEBUG,
+    DebugFlags
 )
 from .common import debug_print as debug_print_common
 from .loglevels import (
     LogLevel,
     get_current_min_level_msg,
     get_current_level,
-    get_current_index
+    get_current_index,
+    get_current_time_ns,
+    monotonic_ns,
+    print_lines
 )
 from .outcomes import (
     fixture_outcome_conditionals,
@@ -36,10 +56,30 @@ from .outcomes import (
 # TODO The traceback depth set here is just an arbitrary figure and could be
 # user configurable up to the maximum (1000?).
 MAX_TRACEBACK_DEPTH = 20
+# Maximum number of call sites in the verify source snippet cache.
+SOURCE_CACHE_SIZE = 1024
+# filter_results parameter combinations for which a summary (result type code
+# counts) is updated as each result is saved. Parameters are in the order
+# used to build the summary keys.
+SUMMARY_PARAMS = ("phase", "scope", "fixture_name", "class_name",
+                  "module_name", "test_function")
+# Result attribute for each filter_results parameter
+FILTER_ATTRIBUTES = dict(phase="phase", scope="scope",
+                         fixture_name="fixture_name", class_name="class_name",
+                         module_name="module", test_function="test_function")
+SUMMARY_KEYS = (
+    ("phase", "scope"),
+    ("phase", "scope", "class_name"),
+    ("phase", "scope", "module_name"),
+    ("phase", "scope", "test_function"),
+    ("phase", "fixture_name", "test_function"),
+    ("phase", "test_function"),
+)
 
 
 def debug_print(msg, prettify=None):
-    debug_print_common(msg, DEBUG["verify"], prettify)
+    if DebugFlags.verify:
+        debug_print_common(msg, DEBUG["verify"], prettify)
 
 
 class WarningException(Exception):
@@ -61,32 +101,140 @@ class Verifications(object):
                 summary[result.type_code] += 1
         return summary
 
-    @classmethod
-    def raise_exc_type(cls, results, type_to_raise):
-        for i, saved_result in enumerate(results):
-            if saved_result.traceback_link:
-                exc_type = saved_result.traceback_link.exc_type
-                debug_print("saved traceback index: {}, type: {}, "
-                            "searching for: {}".format(i, exc_type,
-                                                       type_to_raise),
-                            DEBUG["verify"])
-                if (exc_type == type_to_raise and not
-                        saved_result.traceback_link.raised):
-                    msg = "{0.msg} - {0.status}".format(saved_result)
-                    tb = saved_result.traceback_link.exc_traceback
-                    debug_print("Re-raising first saved {}: {} {} {}"
-                                .format(type_to_raise, exc_type, msg, tb))
-                    set_saved_raised()  # FIXME is this required?
-                    # for python 2 and 3 compatibility
-                    return dict(
-                        exc_type=exc_type,
-                        exc_msg=msg,
-                        exc_tb=tb
-                    )
+    def raise_exc_type(self, type_to_raise, **filters):
+        """Return the first saved exception of type_to_raise that has not
+        been raised yet from the results matching the filter_results
+        parameters (all saved results if none are specified).
+        """
+        for saved_traceback in self._unraised.get(type_to_raise, ()):
+            if _result_matches(saved_traceback.result_link, filters):
+                break
+        else:
+            return
+        msg = "{0.msg} - {0.status}".format(saved_traceback.result_link)
+        tb = saved_traceback.exc_traceback
+        debug_print(lambda: "Re-raising first saved {}: {} {}"
+                    .format(type_to_raise, msg, tb))
+        set_saved_raised()  # FIXME is this required?
+        # for python 2 and 3 compatibility
+        return dict(
+            exc_type=type_to_raise,
+            exc_msg=msg,
+            exc_tb=tb
+        )
+
+    def set_raised(self):
+        # Set all saved tracebacks as raised (and release their frames).
+        for pending in self._unraised.values():
+            for saved_traceback in pending:
+                saved_traceback.raised = True
+            pending.clear()
+        self.release_frames()
 
     def __init__(self):
         self.saved_tracebacks = []
         self.saved_results = []
+        # Saved tracebacks still referencing their frames
+        self._tracebacks_with_frames = []
+        # Saved tracebacks not yet raised, in saved order for each
+        # exception type
+        self._unraised = {}
+        # Secondary indexes of saved_results (results in saved order), kept
+        # up to date by save_result so filter_results only has to check the
+        # results matching its most selective parameters.
+        self._by_phase = {}
+        self._by_phase_test = {}  # (phase, test function)
+        self._by_phase_scope_module = {}  # (phase, scope, module)
+        self._by_phase_scope_class = {}  # (phase, scope, class)
+        self._by_fixture = {}
+        self._by_module = {}
+        # Summaries of the results for each SUMMARY_KEYS parameter
+        # combination, keyed by (parameters, values).
+        self._summaries = {}
+
+    def save_result(self, result):
+        self.saved_results.append(result)
+        self._by_phase.setdefault(result.phase, []).append(result)
+        self._by_phase_test.setdefault(
+            (result.phase, result.test_function), []).append(result)
+        self._by_phase_scope_module.setdefault(
+            (result.phase, result.scope, result.module), []).append(result)
+        self._by_phase_scope_class.setdefault(
+            (result.phase, result.scope, result.class_name), []).append(result)
+        self._by_fixture.setdefault(result.fixture_name, []).append(result)
+        self._by_module.setdefault(result.module, []).append(result)
+        values = dict(phase=result.phase, scope=result.scope,
+                      fixture_name=result.fixture_name,
+                      class_name=result.class_name, module_name=result.module,
+                      test_function=result.test_function)
+        for params in SUMMARY_KEYS:
+            key = (params, tuple(values[param] for param in params))
+            summary = self._summaries.setdefault(key, {})
+            summary[result.type_code] = summary.get(result.type_code, 0) + 1
+
+    def save_traceback(self, failure_traceback):
+        self.saved_tracebacks.append(failure_traceback)
+        if failure_traceback.exc_traceback is not None:
+            self._tracebacks_with_frames.append(failure_traceback)
+        if not failure_traceback.raised:
+            self._unraised.setdefault(failure_traceback.exc_type,
+                                      deque()).append(failure_traceback)
+
+    def release_frames(self):
+        # Release the frames of all saved tracebacks, only their formatted
+        # versions are kept.
+        for failure_traceback in self._tracebacks_with_frames:
+            failure_traceback.release_frames()
+        self._tracebacks_with_frames = []
+
+    def evict_module(self, module_name):
+        """Discard the saved results and tracebacks of a module. The result
+        summaries (type code counters) are kept.
+        """
+        def keep(result):
+            return result.module != module_name
+
+        self.saved_results[:] = [res for res in self.saved_results
+                                 if keep(res)]
+        self.saved_tracebacks[:] = [tb for tb in self.saved_tracebacks
+                                    if tb.result_link is None or
+                                    keep(tb.result_link)]
+        self._tracebacks_with_frames = [
+            tb for tb in self._tracebacks_with_frames
+            if tb.result_link is None or keep(tb.result_link)]
+        for exc_type, pending in self._unraised.items():
+            self._unraised[exc_type] = deque(
+                tb for tb in pending
+                if tb.result_link is None or keep(tb.result_link))
+        self._by_module.pop(module_name, None)
+        for index in (self._by_phase, self._by_phase_test,
+                      self._by_phase_scope_module, self._by_phase_scope_class,
+                      self._by_fixture):
+            for key, results in list(index.items()):
+                results = [res for res in results if keep(res)]
+                if results:
+                    index[key] = results
+                else:
+                    del index[key]
+
+    def results_summary(self, **filters):
+        """Return the summary (count of each result type code) of the saved
+        results matching the filter_results parameters.
+        """
+        params = tuple(param for param in SUMMARY_PARAMS
+                       if filters.get(param))
+        if params not in SUMMARY_KEYS:
+            return self._results_summary(self.filter_results(**filters))
+        key = (params, tuple(filters[param] for param in params))
+        return dict(self._summaries.get(key, {}))
+
+    @staticmethod
+    def _merge_summaries(*summaries):
+        merged = {}
+        for summary in summaries:
+            for type_code, count in summary.items():
+                merged[type_code] = merged.get(type_code, 0) + count
+        return merged
 
     # Raise any saved VerificationExceptions over WarningExceptions
     # Any other exceptions have already been raised (and saved when caught in
@@ -94,21 +242,27 @@ class Verifications(object):
     def fixture_setup_raise_saved(self, fixture_name, test_name):
         results, summary, outcome = self.fixture_setup_results(fixture_name,
                                                                test_name)
-        self.raise_exc_type(results, VerificationException)
-        self.raise_exc_type(results, WarningException)
+        self.raise_exc_type(VerificationException, phase="setup",
+                            fixture_name=fixture_name, test_function=test_name)
+        self.raise_exc_type(WarningException, phase="setup",
+                            fixture_name=fixture_name, test_function=test_name)
         return results, summary, outcome
 
     def fixture_teardown_raise_saved(self, fixture_name, test_name):
         results, summary, outcome = self.fixture_teardown_results(fixture_name,
                                                                   test_name)
-        self.raise_exc_type(results, VerificationException)
-        self.raise_exc_type(results, WarningException)
+        self.raise_exc_type(VerificationException, phase="teardown",
+                            fixture_name=fixture_name, test_function=test_name)
+        self.raise_exc_type(WarningException, phase="teardown",
+                            fixture_name=fixture_name, test_function=test_name)
         return results, summary, outcome
 
     def fixture_setup_results(self, fixture_name, test_name):
         results = self._fixture_results("setup", fixture_name, test_name)
-        summary = self._results_summary(results)
-        debug_print("{} results summary:".format(fixture_name),
+        summary = self.results_summary(phase="setup",
+                                       fixture_name=fixture_name,
+                                       test_function=test_name)
+        debug_print(lambda: "{} results summary:".format(fixture_name),
                     prettify=summary)
 
         def fixture_outcome(saved_summary):
@@ -116,14 +270,16 @@ class Verifications(object):
                 if outcome_condition(saved_summary):
                     return phase_specific_result("setup", outcome)
 
-        debug_print("{} setup outcome: {}".format(fixture_name,
-                                                  fixture_outcome(summary)))
+        debug_print(lambda: "{} setup outcome: {}".format(
+            fixture_name, fixture_outcome(summary)))
         return results, summary, fixture_outcome(summary)
 
     def fixture_teardown_results(self, fixture_name, test_name):
         results = self._fixture_results("teardown", fixture_name, test_name)
-        summary = self._results_summary(results)
-        debug_print("{} results summary:".format(fixture_name),
+        summary = self.results_summary(phase="teardown",
+                                       fixture_name=fixture_name,
+                                       test_function=test_name)
+        debug_print(lambda: "{} results summary:".format(fixture_name),
                     prettify=summary)
 
         def fixture_outcome(saved_summary):
@@ -131,8 +287,8 @@ class Verifications(object):
                 if outcome_condition(saved_summary):
                     return phase_specific_result("teardown", outcome)
 
-        debug_print("{} teardown outcome: {}".format(fixture_name,
-                                                     fixture_outcome(summary)))
+        debug_print(lambda: "{} teardown outcome: {}".format(
+            fixture_name, fixture_outcome(summary)))
         return results, summary, fixture_outcome(summary)
 
     def _fixture_results(self, phase, fixture_name, test_name):
@@ -141,9 +297,8 @@ class Verifications(object):
 
     def phase_summary_and_outcome(self, phase, result_category,
                                   function_scope=True):
-        results = self.phase_results(phase, function_scope)
-        summary = self._results_summary(results)
-        debug_print("{} results summary:".format(phase.capitalize()),
+        summary = self.phase_summary(phase, function_scope)
+        debug_print(lambda: "{} results summary:".format(phase.capitalize()),
                     prettify=summary)
 
         def phase_outcome(saved_summary, pytest_outcome):
@@ -151,10 +306,27 @@ class Verifications(object):
                 if outcome_condition(saved_summary, pytest_outcome):
                     return phase_specific_result(phase, outcome)
 
-        debug_print("{} outcome: {}".format(
+        debug_print(lambda: "{} outcome: {}".format(
             phase.capitalize(), phase_outcome(summary, result_category)
         ))
-        return results, summary, phase_outcome(summary, result_category)
+        return summary, phase_outcome(summary, result_category)
+
+    def phase_summary(self, phase, function_scope=True):
+        # Summary of the phase_results (without filtering the results).
+        test = SessionStatus.test_function
+        if phase == "call":
+            return self.results_summary(phase=phase, test_function=test)
+        summaries = [self.results_summary(phase=phase, scope="module",
+                                          module_name=SessionStatus.module)]
+        class_name = SessionStatus.class_name
+        if class_name:
+            summaries.append(self.results_summary(phase=phase, scope="class",
+                                                  class_name=class_name))
+        if function_scope:
+            summaries.append(self.results_summary(phase=phase,
+                                                  scope="function",
+                                                  test_function=test))
+        return self._merge_summaries(*summaries)
 
     def phase_results(self, phase, function_scope=True):
         test = SessionStatus.test_function
@@ -180,14 +352,32 @@ class Verifications(object):
 
     def filter_results(self, test_function=None, phase=None, scope=None,
                        fixture_name=None, class_name=None, module_name=None):
-        # DEBUG
-        local_vars = inspect.getargvalues(inspect.currentframe())[-1]
-        params = ["{}:{}".format(k, v) for k, v in local_vars.items() if v is
-                  not None and k != "self"]
-        debug_print("Filter params:", prettify=params)
+        debug_print("Filter params:", prettify=lambda: [
+            "{}:{}".format(k, v) for k, v in sorted(dict(
+                test_function=test_function, phase=phase, scope=scope,
+                fixture_name=fixture_name, class_name=class_name,
+                module_name=module_name).items()) if v is not None])
         # TODO assert if all parameters are None
+        # Only check the results in the most selective index available,
+        # the remaining parameters are then filtered as before.
+        if phase and test_function:
+            candidates = self._by_phase_test.get((phase, test_function), ())
+        elif phase and scope and module_name:
+            candidates = self._by_phase_scope_module.get(
+                (phase, scope, module_name), ())
+        elif phase and scope and class_name:
+            candidates = self._by_phase_scope_class.get(
+                (phase, scope, class_name), ())
+        elif fixture_name:
+            candidates = self._by_fixture.get(fixture_name, ())
+        elif module_name:
+            candidates = self._by_module.get(module_name, ())
+        elif phase:
+            candidates = self._by_phase.get(phase, ())
+        else:
+            candidates = self.saved_results
         filtered = []
-        for res in self.saved_results:
+        for res in candidates:
             if phase:
                 if res.phase != phase:
                     continue
@@ -211,6 +401,108 @@ class Verifications(object):
         return filtered
 
 
+class CallSiteStats(object):
+    # Verification counters for each verify call site (code object, line
+    # number): [calls, passes, warnings, failures, time in verify (ns)]
+    enabled = True
+    sites = {}
+
+
+# Index of the counter incremented for each verification status
+_STATUS_COUNTERS = {"PASS": 1, "WARNING": 2, "FAIL": 3}
+
+
+def _record_call_site(frame, status, start):
+    key = (frame.f_code, frame.f_lineno)
+    counters = CallSiteStats.sites.get(key)
+    if counters is None:
+        counters = CallSiteStats.sites[key] = [0, 0, 0, 0, 0]
+    counters[0] += 1
+    counters[_STATUS_COUNTERS[status]] += 1
+    counters[4] += monotonic_ns() - start
+
+
+def call_site_stats(count):
+    """Return the most executed and the most time consuming (time spent in
+    verify) verify call sites, up to count of each, as lists of dicts.
+    """
+    sites = []
+    for (code, line_number), counters in CallSiteStats.sites.items():
+        calls, passes, warnings, failures, time_ns = counters
+        sites.append(dict(
+            location="{}:{}:{}".format(code.co_filename, line_number,
+                                       code.co_name),
+            calls=calls, passes=passes, warnings=warnings,
+            failures=failures, timeNs=time_ns))
+    most_executed = sorted(sites, key=lambda site: site["calls"],
+                           reverse=True)[:count]
+    most_time = sorted(sites, key=lambda site: site["timeNs"],
+                       reverse=True)[:count]
+    return most_executed, most_time
+
+
+class Durations(object):
+    # Setup, call and teardown durations (ns) of the tests in progress (by
+    # node ID), min heaps of the slowest completed tests and the slowest
+    # fixture setups and teardowns (up to count of each) and the start time
+    # of each fixture teardown in progress (by setup args).
+    count = 10
+    tests = OrderedDict()
+    # (duration, sequence, node ID, phase durations)
+    slowest_tests = []
+    # (duration, sequence, fixture (setup args), scope, test, phase)
+    fixtures = []
+    sequence = 0  # Orders entries with equal durations
+    teardown_start = {}
+
+
+def _push_slowest(heap, entry):
+    if len(heap) < Durations.count:
+        heapq.heappush(heap, entry)
+    elif Durations.count:
+        heapq.heappushpop(heap, entry)
+
+
+def add_test_duration(node_id, phase, duration):
+    """Add the duration (ns) of a test phase. The test is complete after
+    its teardown phase.
+    """
+    phases = Durations.tests.setdefault(node_id, OrderedDict())
+    phases[phase] = duration
+    if phase == "teardown":
+        del Durations.tests[node_id]
+        Durations.sequence += 1
+        _push_slowest(Durations.slowest_tests, (sum(phases.values()),
+                                                Durations.sequence, node_id,
+                                                phases))
+
+
+def add_fixture_duration(setup_args, scope, test, phase, duration):
+    """Add the duration (ns) of a fixture setup or teardown."""
+    Durations.sequence += 1
+    _push_slowest(Durations.fixtures, (duration, Durations.sequence,
+                                       setup_args, scope, test, phase))
+
+
+def slowest_durations(count):
+    """Return the slowest tests (total of the setup, call and teardown
+    durations) and the slowest fixture setups and teardowns, up to count
+    of each, as lists of dicts.
+    """
+    tests = []
+    for duration, _, node_id, phases in sorted(Durations.slowest_tests,
+                                               reverse=True)[:count]:
+        test = dict(nodeId=node_id, durationNs=duration)
+        for phase, phase_duration in phases.items():
+            test["{}Ns".format(phase)] = phase_duration
+        tests.append(test)
+    fixtures = [dict(fixtureName=fixture, scope=scope, testName=test,
+                     phase=phase, durationNs=duration)
+                for duration, _, fixture, scope, test, phase in
+                sorted(Durations.fixtures, reverse=True)[:count]]
+    return tests, fixtures
+
+
 class SessionStatus(object):
     # Track the session status
     phase = None  # Current test phase: setup, call, teardown
@@ -221,6 +513,9 @@ class SessionStatus(object):
     exec_func_fix = None  # Currently executing setup fixture or test function
     active_setups = []  # The setup fixtures currently active (haven't been
     # torn down yet)
+    fixture_stack = []  # (setup args, name, scope) of the active setup
+    # fixtures in the same order as active_setups. The last entry is the
+    # fixture currently being setup or torn down.
     module = None  # Parent module of current test
     class_name = None  # Parent class of current test if applicable
     prev_teardown = None  # Track the most recently completed teardown
@@ -234,6 +529,10 @@ class SessionStatus(object):
     # MongoDB
     mongo = None
     test_object_id = None  # Same as mongo.test_oid
+    batch = None  # Verifications prepared within verify_batch, inserted
+    # to the database on exit
+    batch_sites = None  # Call site source of the verifications within
+    # verify_batch by code object, line number and full_method_trace
 
     verifications = Verifications()
 
@@ -242,29 +541,38 @@ class Result(object):
     """Object used to save a result of the verify function or
     any other caught exceptions.
     """
+    __slots__ = ("step", "msg", "status", "message_index", "time_ns",
+                 "type_code", "source_function", "source_code",
+                 "source_locals", "traceback_link", "raise_immediately",
+                 "class_name", "module", "phase", "scope", "test_function",
+                 "fixture_name", "active", "details")
+    shared_active = ()
+
     def __init__(self, message, status, type_code, scope, source_function,
                  source_code, raise_immediately, message_index=None,
                  source_locals=None, fail_traceback_link=None,
-                 use_prev_teardown=False):
+                 use_prev_teardown=False, details=None):
         # Basic result information
         self.step = get_current_min_level_msg()
         self.msg = message
         self.status = status
         self.message_index = message_index
+        # Timestamp (monotonic clock, ns) of the logged result message
+        self.time_ns = get_current_time_ns()
 
         # Additional result information
         # Type codes:
         # "P": pass, "W": WarningException, "F": VerificationException
         # "A": AssertionError, "O": any Other exception
         self.type_code = type_code
-        self.source = {
-            "module-function-line": source_function,
-            "code": source_code,
-            "locals": source_locals
-        }
+        self.source_function = source_function
+        self.source_code = source_code
+        self.source_locals = source_locals
         # Link to the saved traceback object for failures
         self.traceback_link = fail_traceback_link
         self.raise_immediately = raise_immediately
+        # Counts and failing values of a verify_all result
+        self.details = details
 
         # Information about source of the result
         # self.session = SessionStatus.session  # Required?
@@ -286,7 +594,23 @@ class Result(object):
             self.fixture_name = SessionStatus.exec_func_fix
 
         # DEBUG ONLY
-        self.active = list(SessionStatus.active_setups)
+        # The tuple is shared by all results saved while the active setups
+        # are unchanged.
+        active = tuple(SessionStatus.active_setups)
+        if active != Result.shared_active:
+            Result.shared_active = active
+        self.active = Result.shared_active
+
+    @property
+    def source(self):
+        return {
+            "module-function-line": self.source_function,
+            "code": self.source_code,
+            "locals": self.source_locals
+        }
+
+    def as_dict(self):
+        return {attr: getattr(self, attr) for attr in self.__slots__}
 
     def formatted_dict(self):
         # TODO add session
@@ -316,10 +640,129 @@ class Result(object):
         return f
 
 
+class LocalsSerializer(object):
+    """Convert local variables to bounded string representations (saved
+    with results in place of the objects themselves).
+    Each value is limited to max_length characters and the total for all
+    variables to max_total. Large containers are summarized by their type
+    and length followed by their first items, byte strings by their length
+    and objects with a shape (e.g. numpy arrays, pandas DataFrames) by
+    their type, shape and dtype without creating the full representation.
+    Variable names are filtered by the include and exclude patterns.
+    """
+    # Serializer using the configured limits (see serialize_locals)
+    configured = None
+    max_items = 10
+
+    def __init__(self, max_length, max_total, include=None, exclude=None):
+        self.max_length = max_length
+        self.max_total = max_total
+        self.include = _split_patterns(include)
+        self.exclude = _split_patterns(exclude)
+        self.repr = Repr()
+        self.repr.maxstring = max_length
+        self.repr.maxother = max_length
+        self.repr.maxlong = max_length
+        self.repr.maxlevel = 3
+        for attr in ("maxlist", "maxtuple", "maxdict", "maxset",
+                     "maxfrozenset", "maxdeque", "maxarray"):
+            setattr(self.repr, attr, self.max_items)
+
+    def included(self, name):
+        if self.include and not any(fnmatchcase(name, pattern)
+                                    for pattern in self.include):
+            return False
+        return not any(fnmatchcase(name, pattern) for pattern in self.exclude)
+
+    def serialize(self, local_vars):
+        serialized = OrderedDict()
+        total = 0
+        names = [name for name in local_vars if self.included(name)]
+        for i, name in enumerate(names):
+            if total >= self.max_total:
+                serialized["..."] = "{} more variables not saved".format(
+                    len(names) - i)
+                break
+            text = self.value_repr(local_vars[name])
+            if len(text) > self.max_length:
+                text = text[:self.max_length - 3] + "..."
+            serialized[name] = text
+            total += len(text)
+        return serialized
+
+    def value_repr(self, value):
+        type_name = type(value).__name__
+        try:
+            if isinstance(value, (bytes, bytearray, memoryview)):
+                if len(value) > self.max_length:
+                    return "<{} len={}> {!r}".format(
+                        type_name, len(value), bytes(value[:self.max_length]))
+                return repr(value)
+            if isinstance(value, (list, tuple, dict, set, frozenset)):
+                if len(value) > self.max_items:
+                    return "<{} len={}> {}".format(type_name, len(value),
+                                                   self.repr.repr(value))
+                return self.repr.repr(value)
+            shape = getattr(value, "shape", None)
+            if isinstance(shape, tuple):
+                dtype = getattr(value, "dtype", None)
+                if dtype is None:
+                    return "<{} shape={}>".format(type_name, shape)
+                return "<{} shape={} dtype={}>".format(type_name, shape,
+                                                      dtype)
+            return self.repr.repr(value)
+        except Exception as e:
+            return "<{} (repr failed: {})>".format(type_name, e)
+
+
+def _split_patterns(patterns):
+    if not patterns:
+        return []
+    return [pattern.strip() for pattern in patterns.split(",")
+            if pattern.strip()]
+
+
+def _configured_serializer():
+    if LocalsSerializer.configured is None:
+        LocalsSerializer.configured = LocalsSerializer(
+            CONFIG["local-vars-max-length"].value,
+            CONFIG["local-vars-max-total"].value,
+            CONFIG["local-vars-include"].value,
+            CONFIG["local-vars-exclude"].value
+        )
+    return LocalsSerializer.configured
+
+
+def serialize_locals(local_vars):
+    """Return the bounded string representations of local variables
+    using the configured limits and name patterns (see LocalsSerializer).
+    """
+    return _configured_serializer().serialize(local_vars)
+
+
+def _detail_value(value):
+    # Value saved in the verify_all details. Plain Python numbers are saved
+    # as is (NumPy scalars are converted), other values (e.g. Decimals,
+    # integers outside the BSON range) as their bounded representation.
+    if getattr(value, "shape", None) == () and hasattr(value, "item"):
+        value = value.item()
+    if type(value) in (bool, float) or (type(value) is int and
+                                        -2 ** 63 <= value < 2 ** 63):
+        return value
+    serializer = _configured_serializer()
+    text = serializer.value_repr(value)
+    if len(text) > serializer.max_length:
+        text = text[:serializer.max_length - 3] + "..."
+    return text
+
+
 class FailureTraceback(object):
     """Object used to store the traceback information for a failure or
     warning result.
     """
+    __slots__ = ("exc_type", "exc_traceback", "formatted_traceback",
+                 "raised", "result_link")
+
     def __init__(self, exc_type, exc_traceback, formatted_traceback,
                  raised=False):
         self.exc_type = exc_type
@@ -330,6 +773,14 @@ class FailureTraceback(object):
         self.raised = raised
         self.result_link = None
 
+    def as_dict(self):
+        return {attr: getattr(self, attr) for attr in self.__slots__}
+
+    def release_frames(self):
+        # Drop the traceback (and so every frame and its locals) once it is
+        # no longer required to re-raise the exception.
+        self.exc_traceback = None
+
 
 def verify(fail_condition, fail_message, raise_immediately=True,
            warning=False, warn_condition=None, warn_message=None,
@@ -341,19 +792,163 @@ def verify(fail_condition, fail_message, raise_immediately=True,
                                 full_method_trace, stop_at_test, log_level)
 
 
+@contextmanager
+def verify_batch():
+    """Defer the database inserts of the verifications (and the log
+    messages) written within the context. On exit they are inserted with
+    a single bulk insert of each and a single update of each parent
+    document. Results are saved (and raised) as usual, soft verifications
+    (raise_immediately=False) are raised at the end of the phase.
+    """
+    if SessionStatus.batch is not None:
+        # Nested, inserted on exit from the outermost batch
+        yield
+        return
+    SessionStatus.batch = []
+    SessionStatus.batch_sites = {}
+    SessionStatus.mongo.start_log_batch()
+    try:
+        yield
+    finally:
+        prepared, SessionStatus.batch = SessionStatus.batch, None
+        SessionStatus.batch_sites = None
+        SessionStatus.mongo.end_log_batch()
+        if prepared:
+            SessionStatus.mongo.insert_verifications(prepared)
+
+
+def verify_all(values, predicate=None, lower=None, upper=None,
+               fail_message="", raise_immediately=True, warning=False,
+               max_reported=5, full_method_trace=False, stop_at_test=True,
+               log_level=None):
+    """Verify all values of a sequence (or NumPy array) as a single
+    verification. A value passes if predicate(value) is True and it is
+    within the (inclusive) lower and upper bounds. NumPy arrays are
+    evaluated in one vectorized pass, predicate is then called once with
+    the array and must return an array of booleans.
+    One result is saved with the number of values checked and failed and
+    the first and worst (furthest outside the bounds) max_reported failing
+    indices and values.
+    """
+    if predicate is None and lower is None and upper is None:
+        raise ValueError("verify_all requires a predicate or bounds")
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        details = _verify_array(values, predicate, lower, upper,
+                                max_reported)
+    else:
+        details = _verify_sequence(values, predicate, lower, upper,
+                                   max_reported)
+    if details["failed"]:
+        msg = "{} ({} of {} values failed, first: {}".format(
+            fail_message, details["failed"], details["checked"],
+            _format_failures(details["first"]))
+        if details["worst"] is not None:
+            msg += ", worst: {}".format(_format_failures(details["worst"]))
+        msg += ")"
+    else:
+        msg = "{} ({} values)".format(fail_message, details["checked"])
+    return perform_verification(not details["failed"], msg, raise_immediately,
+                                warning, None, None, full_method_trace,
+                                stop_at_test, log_level, details=details)
+
+
+def _verify_sequence(values, predicate, lower, upper, max_reported):
+    # Only the first and the worst max_reported failures are kept. The
+    # worst are held in a min-heap of (distance outside the bounds,
+    # -index, index, value), earlier failures are kept on ties.
+    bounded = lower is not None or upper is not None
+    first = []
+    worst = []
+    checked = 0
+    failed = 0
+    for i, value in enumerate(values):
+        checked += 1
+        excess = _bounds_excess(value, lower, upper)
+        if excess > 0 or (predicate is not None and not predicate(value)):
+            failed += 1
+            if len(first) < max_reported:
+                first.append([i, _detail_value(value)])
+            if not bounded or max_reported <= 0:
+                continue
+            if len(worst) < max_reported:
+                heapq.heappush(worst, (excess, -i, i, _detail_value(value)))
+            elif (excess, -i) > worst[0][:2]:
+                heapq.heapreplace(worst, (excess, -i, i,
+                                          _detail_value(value)))
+    if bounded:
+        worst = [[i, value] for _, _, i, value in sorted(worst,
+                                                         reverse=True)]
+    else:
+        worst = None
+    return dict(checked=checked, failed=failed, first=first, worst=worst)
+
+
+def _bounds_excess(value, lower, upper):
+    # Distance of value outside the bounds (0 if within, inf for NaN).
+    excess = 0
+    if lower is not None and not value >= lower:
+        excess = lower - value
+    if upper is not None and not value <= upper:
+        above = value - upper
+        if not above <= excess:
+            # Also taken if NaN
+            excess = above
+    if excess != excess:
+        excess = float("inf")
+    return excess
+
+
+def _verify_array(values, predicate, lower, upper, max_reported):
+    flat = values.ravel()
+    passed = numpy.ones(flat.shape, dtype=bool)
+    if predicate is not None:
+        passed &= numpy.asarray(predicate(values), dtype=bool).ravel()
+    excess = None
+    if lower is not None or upper is not None:
+        excess = numpy.zeros(flat.shape)
+        with numpy.errstate(invalid="ignore"):
+            if lower is not None:
+                excess = numpy.fmax(excess, lower - flat)
+            if upper is not None:
+                excess = numpy.fmax(excess, flat - upper)
+            excess[numpy.isnan(flat)] = numpy.inf
+        passed &= excess <= 0
+    failing = numpy.flatnonzero(~passed)
+
+    def reported(indices):
+        if values.ndim > 1:
+            return [[[int(j) for j in numpy.unravel_index(i, values.shape)],
+                     _detail_value(flat[i])] for i in indices]
+        return [[int(i), _detail_value(flat[i])] for i in indices]
+
+    worst = None
+    if excess is not None:
+        order = numpy.argsort(-excess[failing], kind="stable")
+        worst = reported(failing[order[:max_reported]])
+    return dict(checked=int(flat.size), failed=int(failing.size),
+                first=reported(failing[:max_reported]), worst=worst)
+
+
+def _format_failures(failures):
+    return ", ".join("[{}]={}".format(i, value) for i, value in failures)
+
+
 def perform_verification(fail_condition, fail_message, raise_immediately,
                          warning, warn_condition, warn_message,
-                         full_method_trace, stop_at_test, log_level):
+                         full_method_trace, stop_at_test, log_level,
+                         details=None):
     """Perform a verification of a given condition using the parameters
     provided.
     """
+    if CallSiteStats.enabled:
+        start = monotonic_ns()
+    # Frames: perform_verification, verify (or verify_all), caller
+    call_site = sys._getframe(2)
     if warning:
         raise_immediately = False
 
     debug_print("Performing verification")
-    debug_print("Locals: {}".format(
-        inspect.getargvalues(inspect.stack()[1][0]).locals)
-    )
+    debug_print(lambda: "Locals: {}".format(sys._getframe(1).f_locals))
 
     def warning_init():
         debug_print("WARNING (fail_condition)")
@@ -400,8 +995,10 @@ def perform_verification(fail_condition, fail_message, raise_immediately,
     LogLevel.verification("{} - {}".format(msg, status), status[0],
                           log_level=verify_msg_log_level, tags=status)
     index = get_current_index()
-    _save_result(msg, status, exc_type, exc_tb, stop_at_test,
-                 full_method_trace, raise_immediately, index)
+    _save_result(call_site, msg, status, exc_type, exc_tb, stop_at_test,
+                 full_method_trace, raise_immediately, index, details)
+    if CallSiteStats.enabled:
+        _record_call_site(call_site, status, start)
 
     if not fail_condition and raise_immediately:
         # Raise immediately
@@ -416,19 +1013,17 @@ def perform_verification(fail_condition, fail_message, raise_immediately,
     return simple, status, exc_type
 
 
-def _get_complete_traceback(stack, start_depth, stop_at_test,
+def _get_complete_traceback(frame, start_depth, stop_at_test,
                             full_method_trace, tb=[]):
     # Print call lines or source code back to beginning of each calling
-    # function (fullMethodTrace).
-    if len(stack) > MAX_TRACEBACK_DEPTH:
-        debug_print("Length of stack = {}".format(len(stack)))
-        max_traceback_depth = MAX_TRACEBACK_DEPTH
-    else:
-        max_traceback_depth = len(stack)
-
-    for depth in range(start_depth, max_traceback_depth):  # Already got 3
-        calling_func = _get_calling_func(stack, depth, stop_at_test,
+    # function (fullMethodTrace). Walk back from frame (at start_depth in
+    # the stack) up to the maximum traceback depth.
+    depth = start_depth
+    while frame is not None and depth < MAX_TRACEBACK_DEPTH:
+        calling_func = _get_calling_func(frame, stop_at_test,
                                          full_method_trace)
+        frame = frame.f_back
+        depth += 1
         if calling_func:
             source_function, source_locals, source_call = calling_func
             tb_new = dict(
@@ -443,44 +1038,122 @@ def _get_complete_traceback(stack, start_depth, stop_at_test,
     return tb
 
 
-def _get_calling_func(stack, depth, stop_at_test, full_method_trace):
+def _get_calling_func(frame, stop_at_test, full_method_trace,
+                      capture_locals=True):
+    # Source lines are only read for the frames reported.
+    sites = SessionStatus.batch_sites
+    if sites is None:
+        call_site = _source_cache.get(frame, full_method_trace)
+    else:
+        key = (frame.f_code, frame.f_lineno, full_method_trace)
+        try:
+            call_site = sites[key]
+        except KeyError:
+            call_site = sites[key] = _source_cache.get(frame,
+                                                       full_method_trace)
+    if call_site is None:
+        return
+    module_line_parent, func_call_source_line, calling_source = call_site
+    if stop_at_test and trace_end_detected(func_call_source_line):
+        return
+    calling_frame_locals = {}
+    if capture_locals and (CONFIG["include-verify-local-vars"].value
+                           or CONFIG["include-all-local-vars"].value):
+        try:
+            calling_frame_locals = serialize_locals(frame.f_locals)
+        except Exception as e:
+            LogLevel.step("Failed to retrieve local variables for {}"
+                          .format(module_line_parent), log_level=5)
+            debug_print("{}".format(str(e)))
+    return module_line_parent, calling_frame_locals, list(calling_source)
+
+
+def _get_call_site(frame, full_method_trace):
+    # Return the location, call source line (stripped) and source code
+    # snippet for the current line of frame, or None if the source is not
+    # available.
     calling_source = []
     try:
-        func_source = inspect.getsourcelines(stack[depth][0])
+        func_source = inspect.getsourcelines(frame)
     except Exception as e:
         debug_print("{}".format(str(e)))
         return
+    func_line_number = func_source[1]
+    code = frame.f_code
+    call_line_number = frame.f_lineno
+    func_call_source_line = linecache.getline(code.co_filename,
+                                              call_line_number,
+                                              frame.f_globals)
+    module_line_parent = "{}:{}:{}".format(code.co_filename,
+                                           call_line_number, code.co_name)
+    if full_method_trace:
+        for lineNumber in range(0, call_line_number - func_line_number):
+            source_line = re.sub('[\r\n]', '', func_source[0][lineNumber])
+            calling_source.append(source_line)
+        source_line = re.sub('[\r\n]', '', func_source[0][
+            call_line_number-func_line_number][1:])
+        calling_source.append(">{}".format(source_line))
     else:
-        func_line_number = func_source[1]
-        func_call_source_line = "{0[4][0]}".format(stack[depth])
-        if stop_at_test and trace_end_detected(func_call_source_line.strip()):
-            return
-        call_line_number = stack[depth][2]
-        module_line_parent = "{0[1]}:{0[2]}:{0[3]}".format(stack[depth])
-        calling_frame_locals = {}
-        if (CONFIG["include-verify-local-vars"].value
-                or CONFIG["include-all-local-vars"].value):
+        calling_source = _get_call_source(func_source,
+                                          func_call_source_line,
+                                          call_line_number,
+                                          func_line_number)
+    return (module_line_parent, func_call_source_line.strip(),
+            tuple(calling_source))
+
+
+class _SourceCache(object):
+    """LRU cache of the call site information (_get_call_site) keyed by
+    code object, line number and full_method_trace. An entry is
+    recomputed if the modification time of its source file changes. The
+    modification time of each file is read once per test (new_test).
+    """
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.mtimes = {}
+
+    def get(self, frame, full_method_trace):
+        code = frame.f_code
+        key = (code, frame.f_lineno, full_method_trace)
+        try:
+            mtime = self.mtimes[code.co_filename]
+        except KeyError:
             try:
-                calling_frame_locals = dict(list(
-                    inspect.getargvalues(stack[depth][0]).locals.items()
-                ))
-            except Exception as e:
-                LogLevel.step("Failed to retrieve local variables for {}"
-                              .format(module_line_parent), log_level=5)
-                debug_print("{}".format(str(e)))
-        if full_method_trace:
-            for lineNumber in range(0, call_line_number - func_line_number):
-                source_line = re.sub('[\r\n]', '', func_source[0][lineNumber])
-                calling_source.append(source_line)
-            source_line = re.sub('[\r\n]', '', func_source[0][
-                call_line_number-func_line_number][1:])
-            calling_source.append(">{}".format(source_line))
-        else:
-            calling_source = _get_call_source(func_source,
-                                              func_call_source_line,
-                                              call_line_number,
-                                              func_line_number)
-        return module_line_parent, calling_frame_locals, calling_source
+                mtime = os.stat(code.co_filename).st_mtime
+            except (OSError, ValueError):
+                mtime = None
+            self.mtimes[code.co_filename] = mtime
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] == mtime:
+                self.entries.move_to_end(key)
+                return entry[1]
+            # Source file modified
+            linecache.checkcache(code.co_filename)
+        call_site = _get_call_site(frame, full_method_trace)
+        self.entries[key] = (mtime, call_site)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return call_site
+
+    def new_test(self):
+        self.mtimes.clear()
+
+    def clear(self):
+        self.entries.clear()
+        self.mtimes.clear()
+
+
+_source_cache = _SourceCache(SOURCE_CACHE_SIZE)
+
+
+def start_of_test_source_checks():
+    """Check the source files of the verify call sites for modifications
+    again (once per file during each test).
+    """
+    _source_cache.new_test()
 
 
 # TODO modify this so the traceback goes back far enough to detect the scope
@@ -495,40 +1168,50 @@ def trace_end_detected(func_call_line):
     return any(item in func_call_line for item in stop_keywords)
 
 
-def _save_result(msg, status, exc_type, exc_tb, stop_at_test,
-                 full_method_trace, raise_immediately, message_index):
+def _save_result(calling_frame, msg, status, exc_type, exc_tb, stop_at_test,
+                 full_method_trace, raise_immediately, message_index,
+                 details=None):
     """Save a result of verify/_verify.
     Items to save:
     Result object for all results, plus FailureTraceback object for results
     other than pass.
     """
-    stack = inspect.stack()
+    # Frames: _save_result, perform_verification, verify (or verify_all),
+    # calling function
     depth = 3
 
     debug_print("Saving a result of verify function")
     fixture_scope = None
-    if SessionStatus.phase != "call":
+    if SessionStatus.phase != "call" and SessionStatus.fixture_stack:
+        fixture_name, fixture_scope = SessionStatus.fixture_stack[-1][1:]
+        debug_print(lambda: "scope for {} is {}".format(fixture_name,
+                                                        fixture_scope))
+    elif SessionStatus.phase != "call":
+        # Fallback: find the FixtureDef in the calling frames
+        frame = calling_frame
         for d in range(depth, depth+6):  # TODO use max tb depth?
+            if frame is None:
+                break
             # For setup and teardown phases (in fixture), parse locals in
             # stack to extract the fixture name and scope
             # Locals for current frame
-            stack_locals = OrderedDict(list(inspect.getargvalues(stack[d][0]).
-                                       locals.items()))
-            for item in list(stack_locals.values()):
+            for item in list(frame.f_locals.values()):
                 if isinstance(item, FixtureDef):
                     fixture_name = item.argname
                     fixture_scope = item.scope
-                    debug_print("scope for {} is {} [{}]".format(fixture_name,
-                                                                 fixture_scope,
-                                                                 d))
+                    debug_print(lambda: "scope for {} is {} [{}]".format(
+                        fixture_name, fixture_scope, d))
             if fixture_scope:
                 break
+            frame = frame.f_back
 
-    # Get the calling function and local vars for all results.
-    # Don't really need to do this for all results, passes? so if
-    # performance suffers this could be removed.
+    # Get the calling function for all results. Local vars are only
+    # captured for passes if configured.
+    type_code = status[0]
     source_function, source_locals, source_call = \
-        _get_calling_func(stack, depth, True, full_method_trace)
+        _get_calling_func(calling_frame, True, full_method_trace,
+                          type_code != "P" or
+                          CONFIG["include-pass-local-vars"].value)
     tb_depth_1 = [source_function]
     if source_locals:
         tb_depth_1.append(source_locals)
@@ -540,36 +1223,47 @@ def _save_result(msg, status, exc_type, exc_tb, stop_at_test,
         code=source_call
     )]
     depth += 1
-    s_res = SessionStatus.verifications.saved_results
-    type_code = status[0]
     if type_code == "F" or type_code == "W":
         # Types processed by this function are "P", "F" and "W"
-        trace_complete = _get_complete_traceback(stack, depth, stop_at_test,
+        trace_complete = _get_complete_traceback(calling_frame.f_back, depth,
+                                                 stop_at_test,
                                                  full_method_trace,
                                                  tb=trace_complete)
 
-        s_tb = SessionStatus.verifications.saved_tracebacks
-        s_tb.append(FailureTraceback(exc_type, exc_tb, trace_complete))
-        failure_traceback = s_tb[-1]
+        failure_traceback = FailureTraceback(exc_type, exc_tb, trace_complete)
+        SessionStatus.verifications.save_traceback(failure_traceback)
     else:
         failure_traceback = None
     result = Result(msg, status, type_code, fixture_scope,
                     source_function, source_call, raise_immediately,
                     message_index=message_index,
                     source_locals=source_locals,
-                    fail_traceback_link=failure_traceback)
-    s_res.append(result)
-    SessionStatus.mongo.insert_verification(result)
+                    fail_traceback_link=failure_traceback,
+                    details=details)
+    SessionStatus.verifications.save_result(result)
+    if SessionStatus.batch is not None:
+        SessionStatus.batch.append(
+            SessionStatus.mongo.prepare_verification(result))
+    else:
+        SessionStatus.mongo.insert_verification(result)
     if type_code == "F" or type_code == "W":
         # Update the reference link from the traceback to the result
-        s_tb[-1].result_link = s_res[-1]
+        failure_traceback.result_link = result
 
 
 def set_saved_raised():
     # Set saved traceback as raised so they are not subsequently raised
     # again.
-    for saved_traceback in SessionStatus.verifications.saved_tracebacks:
-        saved_traceback.raised = True
+    SessionStatus.verifications.set_raised()
+
+
+def _result_matches(result, filters):
+    # Check a result against filter_results parameters (None values are
+    # ignored).
+    for param, value in filters.items():
+        if value and getattr(result, FILTER_ATTRIBUTES[param]) != value:
+            return False
+    return True
 
 
 def _get_call_source(func_source, func_call_source_line, call_line_number,
@@ -602,44 +1296,77 @@ def _get_call_source(func_source, func_call_source_line, call_line_number,
     return trace_level
 
 
+class ResultsTable(object):
+    # Column widths are sized from the first sample_size rows of a results
+    # table and limited to max_width, longer values are truncated.
+    sample_size = 200
+    max_width = 60
+
+
 def print_results(saved_verifications, column_key_order="Step",
-                  alternative_title=None):
+                  alternative_title=None, collapse_passes=None):
     """Format a list of saved results as a table and print.
     The results are printed in the order they were saved.
-    saved_verifications -- list of saved Result objects.
+    saved_verifications -- iterable of saved Result objects.
     Keyword arguments:
     column_key_order -- specify the column order. Default is to have
     "Step" (top level message) in the first column.
     alternative_title -- An optional alternative title for the results
     table. The default title is 'Saved Results'.
+    collapse_passes -- Print consecutive passed results as a single row
+    (count of the passes). Default is the collapse-passed-results option.
     """
     if not isinstance(column_key_order, (tuple, list)):
         column_key_order = [column_key_order]
     debug_print_common("Column order: {}".format(column_key_order),
                        DEBUG["print-saved"])
+    if collapse_passes is None:
+        collapse_passes = CONFIG["collapse-passed-results"].value
 
-    to_print = []
-    tb_links = []
-    for saved_result in saved_verifications:
-        to_print.append(saved_result.formatted_dict())
-        tb_links.append(saved_result.traceback_link)
+    results = iter(saved_verifications)
+    first_result = next(results, None)
+    if first_result is None:
+        return
+    keys = list(column_key_order)
+    keys.extend(key for key in first_result.formatted_dict()
+                if key not in column_key_order)
+    rows = _table_rows(chain([first_result], results), keys,
+                       collapse_passes)
+    sample = list(islice(rows, ResultsTable.sample_size))
 
     key_val_lengths = {}
-    if len(to_print) > 0:
-        _get_val_lengths(to_print, key_val_lengths)
-        headings = _get_key_lengths(key_val_lengths)
-        if alternative_title:
-            LogLevel.high_level_step(alternative_title)
-        else:
-            LogLevel.high_level_step("Saved results")
-        _print_headings(to_print[0], headings, key_val_lengths,
-                        column_key_order)
-        for i, result in enumerate(to_print):
-            _print_result(result, tb_links[i], key_val_lengths,
-                          column_key_order)
-
-
-def print_saved_results(column_key_order="Step", alternative_title=None):
+    for column, key in enumerate(keys):
+        key_val_lengths[key] = min(max(len(values[column]) for values, _ in
+                                       sample), ResultsTable.max_width)
+    headings = _get_key_lengths(key_val_lengths)
+    widths = [key_val_lengths[key] for key in keys]
+    row_format = "".join("| {{{}:^{}}} ".format(column, width)
+                         for column, width in enumerate(widths)) + "|"
+
+    LogLevel.high_level_step(alternative_title or "Saved results")
+    # The headings and rows are printed at log level 1, each run of rows is
+    # written as a single batch (one console write and one database
+    # insert) up to the next row with a traceback. Tracebacks are printed
+    # at log level 3 directly after their row.
+    lines = ["_" * _get_line_length(key_val_lengths),
+             row_format.format(*[headings[key][0] for key in keys]),
+             row_format.format(*[headings[key][1] for key in keys]),
+             "".join("|-{}-".format("-" * width) for width in widths) + "|"]
+    for values, traceback in chain(sample, rows):
+        for column, width in enumerate(widths):
+            if len(values[column]) > width:
+                values[column] = values[column][:width - 2] + ".."
+        lines.append(row_format.format(*values))
+        if traceback:
+            print_lines(lines, 1)
+            lines = []
+            _print_traceback(traceback)
+    if lines:
+        print_lines(lines, 1)
+
+
+def print_saved_results(column_key_order="Step", alternative_title=None,
+                        collapse_passes=None):
     """Format all the saved results as a table and print.
     The results are printed in the order they were saved.
     Keyword arguments:
@@ -647,55 +1374,55 @@ def print_saved_results(column_key_order="Step", alternative_title=None):
     "Step" (top level message) in the first column.
     alternative_title -- An optional alternative title for the results
     table. The default title is 'Saved Results'.
+    collapse_passes -- Print consecutive passed results as a single row
+    (count of the passes). Default is the collapse-passed-results option.
     """
     print_results(SessionStatus.verifications.saved_results,
                   column_key_order=column_key_order,
-                  alternative_title=alternative_title)
-
-
-def _print_result(result, traceback, key_val_lengths, column_key_order):
-    # Print a table row at log level 2 for a single saved result.
-    line = ""
-    for key in column_key_order:
-        # Print values in the order defined by column_key_order.
-        length = key_val_lengths[key]
-        line += '| {0:^{1}} '.format(str(result[key]), length)
-    for key in list(result.keys()):
-        key = key.strip()
-        if key not in column_key_order:
-            length = key_val_lengths[key]
-            val = result[key]
-            line += '| {0:^{width}} '.format(str(val), width=length)
-    line += "|"
-    LogLevel.detail_step(line)
-    # If result has a linked traceback object then print it at log level 3.
-    if traceback:
-        for level in traceback.formatted_traceback:
-            LogLevel.step(level['location'], log_level=3)
-            if level['locals']:
-                local_vars = ["{}: {}".format(k, v) for k, v in level[
-                    'locals'].items() if not k.startswith("@py_")]
-                LogLevel.step(", ".join(local_vars), log_level=3)
-            LogLevel.step("\n".join(level['code']), log_level=3)
-        LogLevel.step("{}: {}".format(traceback.exc_type.__name__,
-                                      traceback.result_link.msg),
-                      log_level=3)
-
-
-def _get_val_lengths(saved_results, key_val_lengths):
-    # Update the maximum field length dictionary based on the length of
-    # the values.
+                  alternative_title=alternative_title,
+                  collapse_passes=collapse_passes)
+
+
+def _table_rows(saved_results, keys, collapse_passes):
+    # Yield the values (strings in column order) and the linked traceback
+    # of each table row. If collapse_passes is set consecutive passed
+    # results are yielded as a single row.
+    passes = []
     for result in saved_results:
-        for key, value in list(result.items()):
-            key = key.strip()
-            if key not in key_val_lengths:
-                key_val_lengths[key] = 0
-            if key == "Extra Info":
-                length = max(key_val_lengths[key],
-                             len(str(value.format_result_info())))
-            else:
-                length = max(key_val_lengths[key], len(str(value)))
-            key_val_lengths[key] = length
+        if collapse_passes and result.status == "PASS":
+            passes.append(result)
+            continue
+        if passes:
+            yield _passes_row(passes, keys), None
+            passes = []
+        formatted = result.formatted_dict()
+        yield [str(formatted[key]) for key in keys], result.traceback_link
+    if passes:
+        yield _passes_row(passes, keys), None
+
+
+def _passes_row(passes, keys):
+    # Table row values for consecutive passed results.
+    formatted = passes[0].formatted_dict()
+    if len(passes) > 1:
+        formatted["Step"] = "{}-{}".format(passes[0].step, passes[-1].step)
+        formatted["Message"] = "{} passed verifications".format(len(passes))
+    return [str(formatted[key]) for key in keys]
+
+
+def _print_traceback(traceback):
+    # Print the traceback linked to a saved result at log level 3.
+    lines = []
+    for level in traceback.formatted_traceback:
+        lines.append(level['location'])
+        if level['locals']:
+            local_vars = ["{}: {}".format(k, v) for k, v in level[
+                'locals'].items() if not k.startswith("@py_")]
+            lines.append(", ".join(local_vars))
+        lines.extend(level['code'])
+    lines.append("{}: {}".format(traceback.exc_type.__name__,
+                                 traceback.result_link.msg))
+    print_lines(lines, 3)
 
 
 def _get_key_lengths(key_val_lengths):
@@ -754,33 +1481,3 @@ def _get_line_length(key_val_lengths):
     line_length += 1
     return line_length
 
-
-def _print_headings(first_result, headings, key_val_lengths,
-                    column_key_order):
-    # Print the headings of the saved results table (keys of
-    # dictionaries stored in saved_results).
-    lines = ["", "", ""]
-    line_length = _get_line_length(key_val_lengths)
-    # LogLevel.detail_step("_" * line_length)
-    print("_" * line_length)  # DEBUG
-    for key in column_key_order:
-        field_length = key_val_lengths[key]
-        for line_index in (0, 1):
-            lines[line_index] += '| ' + '{0:^{width}}'.format(
-                headings[key][line_index], width=field_length) + ' '
-        lines[2] += '|-' + '-'*field_length + '-'
-    for key, value in list(first_result.items()):
-        key = key.strip()
-        if not (((type(column_key_order) is list) and
-                 (key in column_key_order)) or
-                ((type(column_key_order) is not list) and
-                 (key == column_key_order))):
-            field_length = key_val_lengths[key]
-            for line_index in (0, 1):
-                lines[line_index] += ('| ' + '{0:^{width}}'.format(
-                    headings[key][line_index], width=field_length) + ' ')
-            lines[2] += ('|-' + '-'*field_length + '-')
-    for line in lines:
-        line += "|"
-        # LogLevel.detail_step(line)
-        print(line)
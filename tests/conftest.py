@@ -0,0 +1,71 @@
+import os
+import re
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Console log line: "<level>-<step> [<index>] [<tags>] <message>"
+LOG_LINE = re.compile(
+    r"(?<![\w-])(\d+)-(\d+) \[(\d+)\] (?:\[([^\]]*)\] )?(.*)$")
+
+
+class LogLine(object):
+    def __init__(self, level, step, index, tags, msg):
+        self.level = int(level)
+        self.step = int(step)
+        self.index = int(index)
+        self.tags = tags.split(", ") if tags else []
+        self.msg = msg
+
+    def __repr__(self):
+        return "{}-{} [{}] {} {}".format(self.level, self.step, self.index,
+                                        self.tags, self.msg)
+
+
+def log_lines(result):
+    """Return the console log lines of a pytester run as LogLines."""
+    lines = []
+    for line in result.outlines:
+        # The test file name and progress characters may precede the
+        # first log lines of a test
+        match = LOG_LINE.search(line)
+        if match:
+            lines.append(LogLine(*match.groups()))
+    return lines
+
+
+@pytest.fixture
+def run_phases(testdir, monkeypatch):
+    """Run the test module source in a subprocess with the plugin (no
+    database) and return the result and its console log lines.
+    """
+    monkeypatch.setenv("PYTHONPATH", ROOT)
+
+    def run(source, *args):
+        # source is the test module source or a dict of test module names
+        # and sources
+        if isinstance(source, dict):
+            testdir.makepyfile(**source)
+        else:
+            testdir.makepyfile(source)
+        result = testdir.runpytest_subprocess(
+            "-p", "no:phases", "-p", "pytest_phases.pytest_phases", "-s",
+            "--enable=false", "--device=test", "--no-reserve=true",
+            "--root-dir={}".format(testdir.tmpdir.join("results")), *args,
+            timeout=120)
+        return result, log_lines(result)
+    return run
+
+
+def assert_continuous(lines):
+    """Each log line takes the next index and the next step at its level
+    (steps of higher levels restart at 1 after each lower level step).
+    The first line may be at any step.
+    """
+    for previous, line in zip(lines, lines[1:]):
+        assert line.index == previous.index + 1, (previous, line)
+    steps = {lines[0].level: lines[0].step}
+    for line in lines[1:]:
+        steps = {level: step for level, step in steps.items()
+                 if level <= line.level}
+        assert line.step == steps.get(line.level, 0) + 1, line
+        steps[line.level] = line.step
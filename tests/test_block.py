@@ -0,0 +1,40 @@
+from conftest import assert_continuous
+
+SOURCE = """
+from pytest_phases import log
+
+def test_block():
+    log.high_level_step("start")
+    log.block("list", ["a", "b\\nc", "d\\n\\ne\\r", 5, "f  "],
+              tags="T")
+    log.detail_step("after list")
+    log.block("string", "g\\nh\\ni", log_level=4)
+    log.step("after string")
+    log.block("empty", [])
+    log.detail_step("end")
+"""
+
+
+def _block_lines(lines):
+    start = [line.msg for line in lines].index("start")
+    end = [line.msg for line in lines].index("end")
+    return lines[start:end + 1]
+
+
+def test_block_matches_per_line_output(run_phases):
+    # With collapse-repeated-lines enabled each line of a block is written
+    # individually, otherwise the block's records are built in one pass
+    # (_block_records). Both must assign the same steps and indices.
+    _, batched = run_phases(SOURCE)
+    _, per_line = run_phases(SOURCE, "--collapse-repeated-lines=true")
+    batched = _block_lines(batched)
+    per_line = _block_lines(per_line)
+    assert_continuous(batched)
+    assert ([(line.level, line.step, line.index, line.tags, line.msg)
+             for line in batched] ==
+            [(line.level, line.step, line.index, line.tags, line.msg)
+             for line in per_line])
+    messages = [line.msg for line in batched]
+    assert messages[messages.index("list") + 1:
+                    messages.index("after list")] == [
+        "a", "b", "c", "d", "e", "5", "f  "]
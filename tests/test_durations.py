@@ -0,0 +1,61 @@
+from collections import OrderedDict
+import pytest
+from pytest_phases.pytest_phases import _scope_parent
+from pytest_phases.verify import (
+    Durations,
+    add_fixture_duration,
+    add_test_duration,
+    slowest_durations
+)
+
+
+@pytest.fixture
+def durations(monkeypatch):
+    monkeypatch.setattr(Durations, "count", 2)
+    monkeypatch.setattr(Durations, "tests", OrderedDict())
+    monkeypatch.setattr(Durations, "slowest_tests", [])
+    monkeypatch.setattr(Durations, "fixtures", [])
+
+
+def test_slowest_tests_bounded(durations):
+    for i, call in enumerate((5, 1, 9, 3)):
+        node_id = "test_a.py::test_{}".format(i)
+        add_test_duration(node_id, "setup", 1)
+        add_test_duration(node_id, "call", call)
+        assert len(Durations.tests) == 1
+        add_test_duration(node_id, "teardown", 1)
+    assert not Durations.tests
+    assert len(Durations.slowest_tests) == 2
+    tests, _ = slowest_durations(2)
+    assert [test["nodeId"] for test in tests] == ["test_a.py::test_2",
+                                                  "test_a.py::test_0"]
+    assert tests[0] == dict(nodeId="test_a.py::test_2", durationNs=11,
+                            setupNs=1, callNs=9, teardownNs=1)
+
+
+def test_slowest_fixtures_bounded(durations):
+    for i, duration in enumerate((2, 8, 4, 8)):
+        add_fixture_duration("fixture{}".format(i), "function", "test",
+                             "setup", duration)
+    assert len(Durations.fixtures) == 2
+    _, fixtures = slowest_durations(2)
+    # Equal durations: the latest is kept first
+    assert [fixture["fixtureName"] for fixture in fixtures] == [
+        "fixture3", "fixture1"]
+
+
+def test_durations_disabled(durations, monkeypatch):
+    monkeypatch.setattr(Durations, "count", 0)
+    add_fixture_duration("fixture", "function", "test", "setup", 1)
+    assert slowest_durations(0) == ([], [])
+
+
+@pytest.mark.parametrize("scope, parent", [
+    ("session", ""),
+    ("package", "pkg/sub"),
+    ("module", "pkg/sub/test_a.py"),
+    ("class", "pkg/sub/test_a.py::TestA"),
+    ("function", "pkg/sub/test_a.py::TestA::test_b"),
+])
+def test_scope_parent(scope, parent):
+    assert _scope_parent("pkg/sub/test_a.py::TestA::test_b", scope) == parent
@@ -0,0 +1,98 @@
+SOURCE = """
+import pytest
+from pytest_phases import log, verify
+
+@pytest.fixture(scope="module")
+def module_fixture():
+    yield
+    log.step("module teardown detail", log_level=3)
+
+def test_pass(module_fixture):
+    log.step("pass detail", log_level=3)
+    verify(True, "pass verification")
+
+def test_fail(module_fixture):
+    log.step("fail detail", log_level=3)
+    verify(False, "fail verification")
+
+def test_last(module_fixture):
+    log.step("last detail", log_level=3)
+"""
+
+
+def test_passed_test_messages_discarded(run_phases):
+    result, lines = run_phases(SOURCE, "--flight-recorder-level=3")
+    messages = [line.msg for line in lines]
+    assert "pass detail" not in messages
+    assert "last detail" not in messages
+
+
+def test_failed_test_messages_saved(run_phases):
+    result, lines = run_phases(SOURCE, "--flight-recorder-level=3")
+    messages = [line.msg for line in lines]
+    assert "fail detail" in messages
+    assert "fail verification - FAIL" in messages[messages.index(
+        "fail detail") + 1]
+    assert "Flight recorder: saving 2 buffered messages (0 older messages " \
+           "discarded)" in result.stdout.str()
+
+
+def test_messages_outside_tests_not_held(run_phases):
+    # The module fixture teardown is part of the last test (passed). The
+    # module summary (including the level 3 traceback lines) is logged
+    # after it and is not held by the flight recorder.
+    result, lines = run_phases(SOURCE, "--flight-recorder-level=3")
+    messages = [line.msg for line in lines]
+    assert "module teardown detail" not in messages
+    assert "VerificationException: fail verification" in messages
+
+
+def test_disabled_by_default(run_phases):
+    # The empty integer options of the default configuration are unset
+    result, lines = run_phases(SOURCE)
+    assert "invalid literal" not in result.stdout.str()
+    assert "flight-recorder-level:None" in result.stdout.str()
+    assert "pass detail" in [line.msg for line in lines]
+
+
+PARENTS_SOURCE = """
+import sys
+import pytest
+from pytest_phases import log
+from pytest_phases.verify import SessionStatus
+
+@pytest.fixture(autouse=True)
+def saved_parents(monkeypatch):
+    def insert(records):
+        for record in records:
+            sys.__stdout__.write("SAVED {} {}\\n".format(
+                record.message, record.parent_indices[3]))
+    monkeypatch.setattr(SessionStatus.mongo, "insert_buffered_log_messages",
+                        insert)
+
+def test_fail():
+    log.step("parent", log_level=3)
+    for i in range(3):
+        log.step("child {}".format(i), log_level=4)
+    assert False
+"""
+
+
+def saved_parents(result):
+    return dict(line.split()[2:] for line in result.outlines
+                if line.startswith("SAVED child"))
+
+
+def test_buffered_parent_linked(run_phases):
+    result, lines = run_phases(PARENTS_SOURCE, "--flight-recorder-level=3")
+    parent = [line.index for line in lines if line.msg == "parent"][0]
+    assert saved_parents(result) == {"0": str(parent), "1": str(parent),
+                                     "2": str(parent)}
+
+
+def test_dropped_parent_not_linked(run_phases):
+    # Only the last child and the failed verification are saved, the
+    # parent (level 3) was dropped from the buffer
+    result, lines = run_phases(PARENTS_SOURCE, "--flight-recorder-level=3",
+                               "--flight-recorder-size=2")
+    assert saved_parents(result) == {"2": "None"}
@@ -0,0 +1,41 @@
+from conftest import assert_continuous
+
+SOURCE = """
+import time
+from pytest_phases import log
+
+def test_filters():
+    for _ in range(5):
+        log.detail_step("repeated")
+    log.detail_step("different")
+    print("line\\nline\\nline\\nother")
+    for i in range(20):
+        log.detail_step("line {}".format(i))
+    time.sleep(1.1)
+    log.detail_step("next window")
+"""
+
+
+def test_repeated_lines_take_no_steps(run_phases):
+    result, lines = run_phases(SOURCE, "--collapse-repeated-lines=true")
+    assert_continuous(lines)
+    messages = [line.msg for line in lines]
+    assert messages.count("repeated") == 1
+    assert messages.count("line") == 1
+    assert "Previous message repeated 4 more times" in result.stdout.str()
+    assert "Previous message repeated 2 more times" in result.stdout.str()
+    repeated = messages.index("repeated")
+    assert lines[repeated + 1].msg == "different"
+    assert lines[repeated + 1].step == lines[repeated].step + 1
+
+
+def test_rate_limited_lines_take_no_steps(run_phases):
+    result, lines = run_phases(SOURCE, "--log-rate-limit=5")
+    assert_continuous(lines)
+    messages = [line.msg for line in lines]
+    # The summary of the lines dropped in the first window precedes the
+    # first message of the next window
+    summary = lines[messages.index("next window") - 1]
+    assert summary.tags == ["LOG-LIMIT"]
+    assert summary.msg.startswith("Log rate limit (5 lines per second) "
+                                  "exceeded")
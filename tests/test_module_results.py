@@ -0,0 +1,61 @@
+SOURCES = dict(
+    test_a="""
+import pytest
+from pytest_phases import verify
+
+@pytest.fixture
+def saved_teardown_failure():
+    yield
+    verify(False, "teardown failure", raise_immediately=False)
+
+def test_fail():
+    verify(False, "call failure", raise_immediately=False)
+
+def test_teardown(saved_teardown_failure):
+    verify(True, "call pass")
+
+def test_pass():
+    verify(True, "last pass")
+""",
+    test_b="""
+from pytest_phases import verify
+
+def test_b():
+    verify(True, "b pass")
+"""
+)
+
+
+def tables(lines):
+    """Return the messages of the rows of each saved results table."""
+    tables = []
+    rows = None
+    for line in lines:
+        if line.msg == "MODULE SAVED VERIFICATIONS":
+            rows = []
+            tables.append(rows)
+        elif rows is not None and line.level == 1 and \
+                line.msg.startswith("| "):
+            rows.append(line.msg.split("|")[2].strip())
+        elif line.level == 0:
+            rows = None
+    return tables
+
+
+def check_results(run_phases, *args):
+    result, lines = run_phases(SOURCES, *args)
+    result.assert_outcomes(passed=3, failed=1, error=1)
+    module_a, module_b = tables(lines)[2:]
+    assert module_a == ["Message", "", "call failure", "call pass",
+                        "teardown failure", "last pass"]
+    return module_b
+
+
+def test_results_kept_until_module_complete(run_phases):
+    # Module results are discarded once the next module starts
+    assert check_results(run_phases) == ["Message", "", "b pass"]
+
+
+def test_keep_session_results(run_phases):
+    assert check_results(run_phases, "--keep-session-results=true")[-1] == \
+        "b pass"
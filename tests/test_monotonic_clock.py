@@ -0,0 +1,17 @@
+import subprocess
+import sys
+from conftest import ROOT
+
+SOURCE = """
+import time
+del time.monotonic_ns
+from pytest_phases.loglevels import monotonic_ns, wall_time
+now = monotonic_ns()
+assert isinstance(now, int)
+assert abs(wall_time(now) - time.time()) < 1
+"""
+
+
+def test_clock_without_monotonic_ns():
+    # Python < 3.7 has no time.monotonic_ns
+    subprocess.check_call([sys.executable, "-c", SOURCE], cwd=ROOT)
@@ -0,0 +1,55 @@
+from conftest import assert_continuous
+
+SOURCE = """
+from pytest_phases import verify
+
+def test_results():
+    verify(True, "first pass")
+    verify(False, "soft failure", raise_immediately=False)
+    verify(True, "second pass")
+    verify(True, "third pass")
+"""
+
+
+def table(lines):
+    start = [line.msg for line in lines].index("MODULE SAVED VERIFICATIONS")
+    end = start + 1
+    while lines[end].level > 0:
+        end += 1
+    return lines[start:end]
+
+
+def test_saved_results_table(run_phases):
+    result, lines = run_phases(SOURCE)
+    lines = table(lines)
+    assert_continuous(lines)
+    assert lines[0].level == 0
+    # Headings (3 lines) and a row for each result at level 1
+    rows = [line.msg for line in lines if line.level == 1]
+    assert len(rows) == 4 + 4
+    # All 11 columns (headings may wrap onto the second heading line)
+    headings = [heading.strip() for heading in rows[1].split("|")[1:-1]]
+    assert len(headings) == 11
+    assert headings[:7] + headings[-1:] == [
+        "Step", "Message", "Status", "Class", "Module", "Phase", "Scope",
+        "ID"]
+    assert "first pass" in rows[4] and "PASS" in rows[4]
+    assert "soft failure" in rows[5] and "FAIL" in rows[5]
+    # The traceback follows its row at level 3
+    failed_row = [line.msg for line in lines].index(rows[5])
+    traceback = []
+    for line in lines[failed_row + 1:]:
+        if line.level != 3:
+            break
+        traceback.append(line.msg)
+    assert traceback[-1] == "VerificationException: soft failure"
+    assert "second pass" in lines[failed_row + len(traceback) + 1].msg
+
+
+def test_collapsed_passes(run_phases):
+    result, lines = run_phases(SOURCE, "--collapse-passed-results=true")
+    lines = table(lines)
+    assert_continuous(lines)
+    rows = [line.msg for line in lines if line.level == 1][4:]
+    assert len(rows) == 3
+    assert "soft failure" in rows[1]
@@ -0,0 +1,25 @@
+SOURCE = """
+import sys
+from pytest_phases import verify
+from pytest_phases.verify import SessionStatus
+
+def test_compact_results():
+    verify(True, "first")
+    verify(True, "second")
+    verify(False, "failure", raise_immediately=False)
+    first, second, failure = SessionStatus.verifications.saved_results[-3:]
+    saved_tb = SessionStatus.verifications.saved_tracebacks[-1]
+    # No per instance __dict__, the active setups tuple is shared
+    for obj in (first, failure, saved_tb):
+        assert not hasattr(obj, "__dict__")
+    assert first.active is second.active
+    assert first.source["module-function-line"].endswith(
+        ":test_compact_results")
+    sys.__stdout__.write("COMPACT RESULTS\\n")
+"""
+
+
+def test_results_have_no_dict(run_phases):
+    result, lines = run_phases(SOURCE)
+    assert "COMPACT RESULTS" in result.outlines
+    result.assert_outcomes(failed=1)
@@ -0,0 +1,26 @@
+import pytest
+
+SOURCE = """
+import sys
+from pytest_phases import log
+
+CMD = [sys.executable, "-c",
+       "import sys; print('out \\\\xe9'); sys.stderr.write('err\\\\n')"]
+
+def test_stream():
+    assert log.run_stream(CMD, {}) == 0
+"""
+
+
+@pytest.mark.parametrize("kwargs", [
+    "",
+    "text=True",
+    "universal_newlines=True",
+    "encoding='utf8', errors='strict'",
+])
+def test_run_stream_text_mode(run_phases, kwargs):
+    result, lines = run_phases(SOURCE.format(kwargs))
+    result.assert_outcomes(passed=1)
+    streamed = {line.msg: line.tags for line in lines
+                if line.tags and line.tags[0] in ("STDOUT", "STDERR")}
+    assert streamed == {u"out é": ["STDOUT"], "err": ["STDERR"]}
@@ -0,0 +1,82 @@
+import os
+import sys
+import pytest
+from pytest_phases.verify import _SourceCache
+
+verify_module = sys.modules["pytest_phases.verify"]
+
+
+@pytest.fixture
+def mtimes(monkeypatch):
+    """Count the stats of this file and return its modification time from
+    mtimes["mtime"].
+    """
+    stat = os.stat
+    mtimes = dict(stats=0, mtime=0)
+
+    def counting_stat(path, *args, **kwargs):
+        if path != __file__:
+            return stat(path, *args, **kwargs)
+        mtimes["stats"] += 1
+        return os.stat_result((0,) * 8 + (mtimes["mtime"], 0))
+    monkeypatch.setattr(os, "stat", counting_stat)
+    return mtimes
+
+
+@pytest.fixture
+def computed(monkeypatch):
+    computed = []
+    get_call_site = verify_module._get_call_site
+    monkeypatch.setattr(verify_module, "_get_call_site", lambda *args: (
+        computed.append(args) or get_call_site(*args)))
+    return computed
+
+
+def call_site(cache):
+    return cache.get(sys._getframe(1), False)
+
+
+def verify_site(cache):
+    return call_site(cache)
+
+
+def test_call_site_cached(mtimes, computed):
+    cache = _SourceCache(16)
+    for _ in range(3):
+        site = verify_site(cache)
+        assert site[1] == "return call_site(cache)"
+    assert len(computed) == 1
+
+
+def test_source_file_checked_once_per_test(mtimes):
+    cache = _SourceCache(16)
+    verify_site(cache)
+    # Includes the stats of the first source read (linecache)
+    stats = mtimes["stats"]
+    for _ in range(3):
+        verify_site(cache)
+    assert mtimes["stats"] == stats
+    cache.new_test()
+    verify_site(cache)
+    assert mtimes["stats"] == stats + 1
+
+
+def test_modified_source_recomputed(mtimes, computed):
+    cache = _SourceCache(16)
+    for _ in range(2):
+        verify_site(cache)
+    assert len(computed) == 1
+    mtimes["mtime"] = 1
+    verify_site(cache)
+    assert len(computed) == 1  # Not checked again during the test
+    cache.new_test()
+    verify_site(cache)
+    assert len(computed) == 2
+
+
+def test_least_recently_used_evicted(mtimes, computed):
+    cache = _SourceCache(1)
+    verify_site(cache)
+    call_site(cache)
+    verify_site(cache)
+    assert len(computed) == 3
@@ -0,0 +1,95 @@
+from decimal import Decimal
+import pytest
+from pytest_phases.verify import (
+    LocalsSerializer,
+    _detail_value,
+    _verify_array,
+    _verify_sequence
+)
+
+
+def test_sequence_first_and_worst_failures():
+    values = [1, 5, 9, 2, 7, 7, float("nan")]
+    details = _verify_sequence(values, None, None, 4, 2)
+    assert details["checked"] == 7
+    assert details["failed"] == 5
+    assert details["first"] == [[1, 5], [2, 9]]
+    # NaN is furthest outside the bounds
+    assert details["worst"][0][0] == 6
+    assert details["worst"][1] == [2, 9]
+
+
+def test_sequence_worst_ties_keep_first():
+    details = _verify_sequence([7, 7, 7], None, 0, 5, 2)
+    assert details["worst"] == [[0, 7], [1, 7]]
+
+
+def test_sequence_predicate_only():
+    details = _verify_sequence(range(10), lambda value: value % 3, None,
+                               None, 2)
+    assert details == dict(checked=10, failed=4, first=[[0, 0], [3, 3]],
+                           worst=None)
+
+
+def test_sequence_generator():
+    details = _verify_sequence((i for i in range(1000)), None, None, 9, 3)
+    assert details["failed"] == 990
+    assert details["first"] == [[10, 10], [11, 11], [12, 12]]
+    assert details["worst"] == [[999, 999], [998, 998], [997, 997]]
+
+
+def test_detail_values():
+    assert _detail_value(3) == 3
+    assert _detail_value(2.5) == 2.5
+    assert _detail_value(Decimal("1.5")) == "Decimal('1.5')"
+    assert _detail_value(2 ** 64) == str(2 ** 64)
+    text = _detail_value("x" * 10000)
+    assert text.startswith("'xxx")
+    assert len(text) <= LocalsSerializer.configured.max_length
+
+
+def test_array_details_are_python_values():
+    numpy = pytest.importorskip("numpy")
+    values = numpy.array([1.0, 5.0, numpy.nan, 2.0])
+    details = _verify_array(values, None, None, 3, 5)
+    assert details["failed"] == 2
+    assert details["first"][0] == [1, 5.0]
+    assert type(details["first"][0][1]) is float
+    assert details["worst"][0][0] == 2
+    assert type(_detail_value(numpy.int64(3))) is int
+
+
+def test_array_multi_dimensional_indices():
+    numpy = pytest.importorskip("numpy")
+    values = numpy.arange(6).reshape(2, 3)
+    details = _verify_array(values, None, 1, None, 5)
+    assert details["first"] == [[[0, 0], 0]]
+
+
+def test_locals_serializer_limits():
+    serializer = LocalsSerializer(20, 30, exclude="secret*")
+    serialized = serializer.serialize(dict(
+        text="y" * 100, items=list(range(100)), secret_key="hidden",
+        data=b"z" * 100, other=1))
+    assert "secret_key" not in serialized
+    assert len(serialized["text"]) == 20
+    assert serialized["items"].startswith("<list len=100>")
+    assert serialized["..."] == "2 more variables not saved"
+
+
+def test_locals_serializer_include():
+    serializer = LocalsSerializer(50, 100, include="keep*")
+    assert list(serializer.serialize(dict(keep_me=1, drop_me=2))) == [
+        "keep_me"]
+
+
+def test_locals_serializer_shape():
+    class Frame(object):
+        shape = (10, 2)
+        dtype = "float64"
+
+        def __repr__(self):
+            raise AssertionError("full representation created")
+    serializer = LocalsSerializer(50, 100)
+    assert serializer.value_repr(Frame()) == \
+        "<Frame shape=(10, 2) dtype=float64>"
@@ -0,0 +1,160 @@
+from collections import Counter
+from pymongo.results import InsertManyResult, InsertOneResult
+from pytest_phases.loglevels import (
+    MIN_LEVEL,
+    MAX_LEVEL,
+    MultiLevelLogging,
+    monotonic_ns
+)
+from pytest_phases.mongo import MongoConnector
+from pytest_phases.verify import SessionStatus, verify_batch
+
+
+class FakeCollection(object):
+    """Collection counting the writes (operation, collection name)."""
+    def __init__(self, name, writes):
+        self.name = name
+        self.writes = writes
+        self.docs = []
+
+    def insert_one(self, document):
+        self.writes[("insert_one", self.name)] += 1
+        document.setdefault("_id", len(self.docs))
+        self.docs.append(document)
+        return InsertOneResult(document["_id"], True)
+
+    def insert_many(self, documents):
+        self.writes[("insert_many", self.name)] += 1
+        self.docs.extend(documents)
+        return InsertManyResult([doc["_id"] for doc in documents], True)
+
+    def update_one(self, match, update, upsert=False):
+        self.writes[("update_one", self.name)] += 1
+
+    def bulk_write(self, requests, ordered=True):
+        self.writes[("bulk_write", self.name)] += 1
+
+
+class FakeDatabase(object):
+    def __init__(self):
+        self.writes = Counter()
+
+    def __getattr__(self, name):
+        collection = FakeCollection(name, self.writes)
+        setattr(self, name, collection)
+        return collection
+
+
+class SavedResult(object):
+    phase = "call"
+    type_code = "P"
+
+
+class Mongo(object):
+    """SessionStatus.mongo recording the inserted batches."""
+    def __init__(self):
+        self.inserted = []
+
+    def insert_verifications(self, prepared):
+        self.inserted.append(prepared)
+
+    def start_log_batch(self):
+        pass
+
+    def end_log_batch(self):
+        pass
+
+
+def connector(monkeypatch):
+    mongo = MongoConnector(True, "localhost", "test", None)
+    mongo.db = FakeDatabase()
+    monkeypatch.setattr(MongoConnector, "parents",
+                        ["-"] * (MAX_LEVEL - MIN_LEVEL + 1))
+    monkeypatch.setattr(MultiLevelLogging, "current_time_ns",
+                        monotonic_ns())
+    return mongo
+
+
+def test_verifications_inserted_together(monkeypatch):
+    mongo = connector(monkeypatch)
+    prepared = [(SavedResult(), dict(_id=i) if i % 2 else None, dict(_id=i),
+                 mongo.db.testresults, "test") for i in range(4)]
+    prepared.append((SavedResult(), None, dict(_id=4), mongo.db.fixture,
+                     "fixture"))
+    assert mongo.insert_verifications(prepared) == list(range(5))
+    assert mongo.db.writes == {("insert_many", "tracebacks"): 1,
+                               ("insert_many", "verifications"): 1,
+                               ("bulk_write", "testresults"): 1,
+                               ("bulk_write", "fixture"): 1}
+
+
+def test_batch_inserted_by_outermost(monkeypatch):
+    mongo = Mongo()
+    monkeypatch.setattr(SessionStatus, "mongo", mongo)
+    with verify_batch():
+        SessionStatus.batch.append(1)
+        with verify_batch():
+            SessionStatus.batch.append(2)
+        assert not mongo.inserted
+    assert mongo.inserted == [[1, 2]]
+    assert SessionStatus.batch is None
+
+
+def test_batch_inserted_on_exception(monkeypatch):
+    mongo = Mongo()
+    monkeypatch.setattr(SessionStatus, "mongo", mongo)
+    try:
+        with verify_batch():
+            SessionStatus.batch.append(1)
+            raise ValueError()
+    except ValueError:
+        pass
+    assert mongo.inserted == [[1]]
+
+
+def test_log_messages_inserted_individually(monkeypatch):
+    mongo = connector(monkeypatch)
+    for i in range(3):
+        mongo.insert_log_message(i, MIN_LEVEL + i, 1, "msg", [])
+    assert mongo.db.writes[("insert_one", "testlogs")] == 3
+
+
+def test_batch_log_messages_inserted_once(monkeypatch):
+    mongo = connector(monkeypatch)
+    mongo.start_log_batch()
+    for i in range(3):
+        mongo.insert_log_message(i, MIN_LEVEL + i, 1, "msg", [])
+    for i in range(3, 6):
+        mongo.insert_log_message(i, MIN_LEVEL + 1, i, "msg", [])
+    assert not mongo.db.writes
+    mongo.end_log_batch()
+    assert mongo.db.writes == {("insert_many", "testlogs"): 1,
+                               ("update_one", "loglinks"): 1}
+    docs = mongo.db.testlogs.docs
+    assert [doc["index"] for doc in docs] == list(range(6))
+    # Descendants of the held messages are counted before insertion
+    assert [doc["numOfChildren"] for doc in docs] == [5, 1, 0, 0, 0, 0]
+    assert docs[2]["parents"] == [docs[0]["_id"], docs[1]["_id"]]
+
+
+def test_batch_updates_existing_parents_once(monkeypatch):
+    mongo = connector(monkeypatch)
+    mongo.insert_log_message(0, MIN_LEVEL, 1, "parent", [])
+    mongo.db.writes.clear()
+    mongo.start_log_batch()
+    for i in range(1, 4):
+        mongo.insert_log_message(i, MIN_LEVEL + 1, i, "child", [])
+    mongo.end_log_batch()
+    assert mongo.db.writes == {("insert_many", "testlogs"): 1,
+                               ("update_one", "loglinks"): 1,
+                               ("bulk_write", "testlogs"): 1}
+
+
+def test_batch_repeats_update_held_message(monkeypatch):
+    mongo = connector(monkeypatch)
+    mongo.start_log_batch()
+    oid = mongo.insert_log_message(0, MIN_LEVEL, 1, "repeated", [])
+    mongo.update_log_repeats(oid, 3, 1.0, 2.0)
+    mongo.end_log_batch()
+    assert ("update_one", "testlogs") not in mongo.db.writes
+    assert mongo.db.testlogs.docs[0]["repeatCount"] == 3